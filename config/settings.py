@@ -31,6 +31,13 @@ class Settings:
     report_time_hour: int = 9
     notion_api_key: str = ""
     notion_clients_db_id: str = ""
+    fetch_concurrency: int = 4
+    api_timeout: float = 60.0
+    metrics_db_path: str = str(PROJECT_ROOT / "data" / "metrics.db")
+    http_pool_size: int = 10
+    http_timeout: float = 30.0
+    graph_backend: str = "sdk"
+    report_mode: str = "digest"
 
     @classmethod
     def load(cls) -> Settings:
@@ -41,6 +48,16 @@ class Settings:
                 print(f"ERROR: ad account ID '{acct}' must start with 'act_'")
                 sys.exit(1)
 
+        graph_backend = os.getenv("GRAPH_BACKEND", "sdk").strip().lower()
+        if graph_backend not in ("sdk", "async"):
+            print(f"ERROR: GRAPH_BACKEND '{graph_backend}' must be 'sdk' or 'async'")
+            sys.exit(1)
+
+        report_mode = os.getenv("REPORT_MODE", "digest").strip().lower()
+        if report_mode not in ("digest", "per_account"):
+            print(f"ERROR: REPORT_MODE '{report_mode}' must be 'digest' or 'per_account'")
+            sys.exit(1)
+
         return cls(
             telegram_bot_token=_require("TELEGRAM_BOT_TOKEN"),
             telegram_chat_id=int(_require("TELEGRAM_CHAT_ID")),
@@ -52,4 +69,13 @@ class Settings:
             report_time_hour=int(os.getenv("REPORT_TIME_HOUR", "9")),
             notion_api_key=os.getenv("NOTION_API_KEY", "").strip(),
             notion_clients_db_id=os.getenv("NOTION_CLIENTS_DB_ID", "").strip(),
+            fetch_concurrency=max(1, int(os.getenv("FETCH_CONCURRENCY", "4"))),
+            api_timeout=float(os.getenv("API_TIMEOUT", "60")),
+            metrics_db_path=os.getenv(
+                "METRICS_DB_PATH", str(PROJECT_ROOT / "data" / "metrics.db")
+            ).strip(),
+            http_pool_size=max(1, int(os.getenv("HTTP_POOL_SIZE", "10"))),
+            http_timeout=float(os.getenv("HTTP_TIMEOUT", "30")),
+            graph_backend=graph_backend,
+            report_mode=report_mode,
         )
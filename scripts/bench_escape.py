@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""Microbenchmark for MarkdownV2 escaping in the report formatters.
+
+Renders the per-account daily reports and the digest for many accounts,
+once with the original hand-written formatter and per-character escaping
+loop and once with the compiled layouts, and checks both produce
+identical text.
+
+    python scripts/bench_escape.py --accounts 500
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import timeit
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+# Allow imports from project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.bot import formatters
+
+
+def loop_esc(text: Any) -> str:
+    """The original implementation, kept as the baseline."""
+    special = r"_*[]()~`>#+-=|{}.!"
+    out = []
+    for ch in str(text):
+        if ch in special:
+            out.append(f"\\{ch}")
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+def loop_daily_report(account_id: str, data: dict[str, Any]) -> str:
+    """The original hand-written daily report, kept as the baseline."""
+    name = loop_esc(data["account_name"])
+    impressions = loop_esc(f"{data['impressions']:,}")
+    clicks = loop_esc(f"{data['clicks']:,}")
+    cpm = loop_esc(f"${data['cpm']:.2f}")
+    frequency = loop_esc(f"{data['frequency']:.2f}")
+    spend = loop_esc(f"${data['spend']:.2f}")
+    leads = loop_esc(str(data["leads"]))
+
+    lines = [
+        f"*{name}*  \\(`{loop_esc(account_id)}`\\)",
+        f"Date: {loop_esc(data['date_start'])}",
+        "",
+        f"Impressions: *{impressions}*",
+        f"Clicks: *{clicks}*",
+        f"CPM: *{cpm}*",
+        f"Frequency: *{frequency}*",
+        f"Spend: *{spend}*",
+        f"Leads: *{leads}*",
+    ]
+    if data["cpl"] is not None:
+        cpl = loop_esc(f"${data['cpl']:.2f}")
+        lines.append(f"CPL: *{cpl}*")
+    else:
+        lines.append("CPL: *N/A* \\(no leads\\)")
+    return "\n".join(lines)
+
+
+def sample_results(n: int) -> list[tuple[str, Any]]:
+    rng = random.Random(0)
+    results: list[tuple[str, Any]] = []
+    for i in range(n):
+        acct = f"act_{1000000000 + i}"
+        if i % 50 == 0:
+            error = RuntimeError(f"(#17) User request limit reached. {i}")
+            results.append((acct, error))
+            continue
+        spend = rng.uniform(0, 5000)
+        leads = rng.randint(0, 200)
+        results.append(
+            (
+                acct,
+                {
+                    "account_name": f"Clinic #{i} - Lead Gen (Main)",
+                    "impressions": rng.randint(0, 10**6),
+                    "clicks": rng.randint(0, 10**4),
+                    "cpm": rng.uniform(1, 50),
+                    "frequency": rng.uniform(1, 3),
+                    "spend": spend,
+                    "leads": leads,
+                    "cpl": spend / leads if leads else None,
+                    "date_start": "2026-10-17",
+                    "date_stop": "2026-10-17",
+                },
+            )
+        )
+    return results
+
+
+def render(
+    results: list[tuple[str, Any]], daily=formatters.format_daily_report
+) -> list[str]:
+    texts = [daily(acct, data) for acct, data in results if isinstance(data, dict)]
+    return texts + formatters.format_digest(results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = sample_results(args.accounts)
+    fields = [str(v) for _, d in results if isinstance(d, dict) for v in d.values()]
+
+    with mock.patch.object(formatters, "_esc", loop_esc):
+        baseline = render(results, loop_daily_report)
+        t_loop = timeit.timeit(
+            lambda: render(results, loop_daily_report), number=args.repeat
+        )
+        e_loop = timeit.timeit(
+            lambda: [loop_esc(x) for x in fields], number=args.repeat
+        )
+
+    assert render(results) == baseline, "escaped output differs from baseline"
+    formatters._esc_str.cache_clear()
+    t_new = timeit.timeit(lambda: render(results), number=args.repeat)
+    e_cached = timeit.timeit(
+        lambda: [formatters._esc(x) for x in fields], number=args.repeat
+    )
+    e_many = timeit.timeit(lambda: formatters._esc_many(*fields), number=args.repeat)
+
+    per = 1000 / args.repeat
+    print(f"{args.accounts} accounts, {len(fields)} fields, {args.repeat} runs")
+    print(
+        f"render   loop {t_loop * per:8.2f} ms   new {t_new * per:8.2f} ms"
+        f"   x{t_loop / t_new:.1f}"
+    )
+    print(f"escape   loop {e_loop * per:8.2f} ms")
+    print(f"         cached _esc {e_cached * per:8.2f} ms   x{e_loop / e_cached:.1f}")
+    print(f"         _esc_many   {e_many * per:8.2f} ms   x{e_loop / e_many:.1f}")
+
+
+if __name__ == "__main__":
+    main()
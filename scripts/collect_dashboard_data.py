@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
 """Fetch Facebook Ads insights and write dashboard/data.json for the static dashboard.
 
-Keeps the last 7 days of data per account. Intended to be run daily by GitHub Actions.
+Daily rows come from the local metrics store, which only downloads days that
+are missing or not yet settled. The 7-day comparison is summarised from the
+same stored days, so no account-day is fetched twice in one run; its
+frequency is therefore an average of daily frequencies, not the API's
+period frequency. Keeps the last 7 days of data per account.
+Intended to be run daily by GitHub Actions.
 """
 from __future__ import annotations
 
@@ -15,8 +20,9 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from config.settings import Settings
+from src.facebook import planner
 from src.facebook.client import init_facebook_api
-from src.facebook.insights import get_comparison_insights, get_daily_insights
+from src.storage.metrics_store import MetricsStore
 
 logging.basicConfig(
     level=logging.INFO,
@@ -63,53 +69,54 @@ def _build_summary(comparison: dict) -> dict:
 def main() -> None:
     settings = Settings.load()
     init_facebook_api(settings)
+    planner.set_default_timezone(settings.timezone)
 
     data = load_existing()
 
-    for account_id in settings.ad_account_ids:
-        logger.info("Fetching insights for %s ...", account_id)
+    accounts = settings.ad_account_ids
+    store = MetricsStore(settings.metrics_db_path)
+    logger.info("Backfilling daily insights for %d accounts ...", len(accounts))
+    # Current and previous 7-day periods for the KPI comparison
+    errors = store.backfill(accounts, 2 * MAX_DAYS)
+
+    for account_id in accounts:
         try:
-            row = get_daily_insights(account_id)
-            if row is None:
+            if account_id in errors:
+                raise errors[account_id]
+            days = store.recent_days(account_id, MAX_DAYS)
+            if not days:
                 logger.warning("No data returned for %s", account_id)
                 continue
 
-            day_entry = {
-                "date": row["date_start"],
-                "impressions": row["impressions"],
-                "clicks": row["clicks"],
-                "cpm": row["cpm"],
-                "frequency": row["frequency"],
-                "spend": row["spend"],
-                "leads": row["leads"],
-                "cpl": row["cpl"],
-            }
-
             account = data["accounts"].setdefault(account_id, {
-                "name": row["account_name"],
+                "name": days[-1]["account_name"],
                 "days": [],
                 "summary": None,
             })
-            account["name"] = row["account_name"]
-
-            # Deduplicate by date (replace existing entry for the same date)
+            account["name"] = days[-1]["account_name"]
             account["days"] = [
-                d for d in account["days"] if d["date"] != day_entry["date"]
+                {
+                    "date": d["date_start"],
+                    "impressions": d["impressions"],
+                    "clicks": d["clicks"],
+                    "cpm": d["cpm"],
+                    "frequency": d["frequency"],
+                    "spend": d["spend"],
+                    "leads": d["leads"],
+                    "cpl": d["cpl"],
+                }
+                for d in days
             ]
-            account["days"].append(day_entry)
-
-            # Sort ascending and keep last N days
-            account["days"].sort(key=lambda d: d["date"])
-            account["days"] = account["days"][-MAX_DAYS:]
 
-            # Fetch 7-day period comparison for KPI cards
-            logger.info("Fetching 7-day comparison for %s ...", account_id)
-            comparison = get_comparison_insights(account_id)
-            account["summary"] = _build_summary(comparison)
+            # 7-day period comparison for KPI cards
+            account["summary"] = _build_summary(
+                store.comparison(account_id, MAX_DAYS)
+            )
 
         except Exception:
             logger.exception("Failed to process account %s", account_id)
 
+    store.close()
     data["last_updated"] = datetime.now(timezone.utc).isoformat()
     save(data)
     logger.info("Dashboard data written to %s", DATA_FILE)
@@ -6,6 +6,7 @@ Intended to be run by GitHub Actions on a schedule, but works locally too.
 from __future__ import annotations
 
 import argparse
+import json
 import logging
 import sys
 from pathlib import Path
@@ -16,8 +17,14 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 import requests
 
 from config.settings import Settings
+from src.facebook import planner
 from src.facebook.client import init_facebook_api
-from src.facebook.insights import get_comparison_insights, get_daily_insights
+from src.facebook.insights import (
+    get_comparison_insights_many,
+    get_daily_insights_many,
+    get_daily_series_many,
+)
+from src.bot import charts
 from src.bot.formatters import format_daily_report, format_weekly_report
 
 logging.basicConfig(
@@ -38,6 +45,56 @@ def send_telegram(token: str, chat_id: int, text: str) -> None:
     logger.info("Telegram message sent (chat_id=%s)", chat_id)
 
 
+def send_telegram_photos(
+    token: str, chat_id: int, images: list[bytes], caption: str
+) -> None:
+    """Send PNGs as media groups, captioning the first photo."""
+    for start in range(0, len(images), charts.MEDIA_GROUP_MAX):
+        chunk = images[start:start + charts.MEDIA_GROUP_MAX]
+        first_caption = {"caption": caption} if start == 0 else {}
+        if len(chunk) == 1:
+            resp = requests.post(
+                f"https://api.telegram.org/bot{token}/sendPhoto",
+                data={"chat_id": chat_id, **first_caption},
+                files={"photo": ("chart.png", chunk[0], "image/png")},
+                timeout=30,
+            )
+        else:
+            media = [
+                {"type": "photo", "media": f"attach://chart{i}",
+                 **(first_caption if i == 0 else {})}
+                for i in range(len(chunk))
+            ]
+            resp = requests.post(
+                f"https://api.telegram.org/bot{token}/sendMediaGroup",
+                data={"chat_id": chat_id, "media": json.dumps(media)},
+                files={
+                    f"chart{i}": (f"chart{i}.png", png, "image/png")
+                    for i, png in enumerate(chunk)
+                },
+                timeout=60,
+            )
+        resp.raise_for_status()
+    logger.info("Sent %d charts (chat_id=%s)", len(images), chat_id)
+
+
+def send_weekly_charts(settings: Settings, accounts: list[str]) -> None:
+    """The same trend charts the bot's /weekly command sends."""
+    ranges = {}
+    for acct in accounts:
+        since, until = planner.last_days(acct, charts.CHART_DAYS)
+        ranges[acct] = (since.isoformat(), until.isoformat())
+    results = get_daily_series_many(ranges)
+    series = charts.chart_series([(acct, results[acct]) for acct in accounts])
+    if series:
+        send_telegram_photos(
+            settings.telegram_bot_token,
+            settings.telegram_chat_id,
+            charts.render_charts(series),
+            charts.chart_caption(),
+        )
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Send Facebook Ads report to Telegram")
     parser.add_argument("--weekly", action="store_true", help="Send 7-day comparison report instead of daily")
@@ -45,21 +102,35 @@ def main() -> None:
 
     settings = Settings.load()
     init_facebook_api(settings)
+    planner.set_default_timezone(settings.timezone)
+
+    accounts = settings.ad_account_ids
+    logger.info("Fetching insights for %d accounts ...", len(accounts))
+    if args.weekly:
+        results = get_comparison_insights_many(accounts)
+    else:
+        results = get_daily_insights_many(accounts)
 
-    for account_id in settings.ad_account_ids:
-        logger.info("Fetching insights for %s ...", account_id)
+    for account_id in accounts:
         try:
+            data = results[account_id]
+            if isinstance(data, Exception):
+                raise data
             if args.weekly:
-                comparison = get_comparison_insights(account_id)
-                text = format_weekly_report(account_id, comparison)
+                text = format_weekly_report(account_id, data)
             else:
-                data = get_daily_insights(account_id)
                 text = format_daily_report(account_id, data)
 
             send_telegram(settings.telegram_bot_token, settings.telegram_chat_id, text)
         except Exception:
             logger.exception("Failed to process account %s", account_id)
 
+    if args.weekly:
+        try:
+            send_weekly_charts(settings, accounts)
+        except Exception:
+            logger.exception("Weekly charts failed")
+
     logger.info("Done.")
 
 
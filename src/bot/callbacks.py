@@ -1,14 +1,18 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import TelegramError
 from telegram.ext import CallbackQueryHandler, ContextTypes
 
 from config.settings import Settings
-from src.bot import formatters, keyboards, medspa
+from src.bot import charts, digest, formatters, keyboards, medspa, paging
 from src.bot.notion_sync import sync_clients, sync_offers
-from src.facebook import insights, management
+from src.facebook import aio
+from src.facebook.entity_cache import entities
+from src.facebook.fanout import fetch_accounts
 
 logger = logging.getLogger("fb-ads-bot")
 
@@ -38,9 +42,18 @@ def make_callback_handler(settings: Settings) -> CallbackQueryHandler:
 
         if data == "cmd_report":
             await query.edit_message_text("Fetching daily report\\.\\.\\.", parse_mode="MarkdownV2")
-            for acct in settings.ad_account_ids:
+            if settings.report_mode == "digest":
+                results = await digest.collect(settings.ad_account_ids)
+                await digest.send_digest(
+                    context.bot, query.message.chat_id, results
+                )
+                return
+            async for acct, d in fetch_accounts(
+                settings.ad_account_ids, aio.get_daily_insights
+            ):
                 try:
-                    d = insights.get_daily_insights(acct)
+                    if isinstance(d, Exception):
+                        raise d
                     text = formatters.format_daily_report(acct, d)
                 except Exception as e:
                     text = formatters.format_error(f"Error for {acct}: {e}")
@@ -49,13 +62,22 @@ def make_callback_handler(settings: Settings) -> CallbackQueryHandler:
 
         if data == "cmd_weekly":
             await query.edit_message_text("Fetching weekly comparison\\.\\.\\.", parse_mode="MarkdownV2")
-            for acct in settings.ad_account_ids:
+            async for acct, comp in fetch_accounts(
+                settings.ad_account_ids, aio.get_comparison_insights
+            ):
                 try:
-                    comp = insights.get_comparison_insights(acct, days=7)
+                    if isinstance(comp, Exception):
+                        raise comp
                     text = formatters.format_weekly_report(acct, comp)
                 except Exception as e:
                     text = formatters.format_error(f"Error for {acct}: {e}")
                 await query.message.reply_text(text, parse_mode="MarkdownV2")
+            try:
+                await charts.send_weekly_charts(
+                    context.bot, query.message.chat_id, settings.ad_account_ids
+                )
+            except Exception:
+                logger.exception("Weekly charts failed")
             return
 
         if data == "cmd_campaigns":
@@ -71,6 +93,17 @@ def make_callback_handler(settings: Settings) -> CallbackQueryHandler:
                 )
             return
 
+        if data == "cmd_drilldown":
+            accts = settings.ad_account_ids
+            if len(accts) == 1:
+                await _show_drilldown_cb(query, accts[0])
+            else:
+                await query.edit_message_text(
+                    "Select an account:",
+                    reply_markup=keyboards.account_selector(accts, "selacct_drill"),
+                )
+            return
+
         if data == "cmd_generate_ads":
             state = medspa.load_state()
             clients = medspa.get_clients(state)
@@ -94,6 +127,7 @@ def make_callback_handler(settings: Settings) -> CallbackQueryHandler:
                 "/report — Yesterday's metrics\n"
                 "/weekly — 7\\-day comparison\n"
                 "/campaigns — Manage campaigns\n"
+                "/drilldown — Spend and leads by ad set, ad, age or placement\n"
                 "/generate\\_ads — Generate med\\-spa ad images\n"
                 "/help — This message"
             )
@@ -245,12 +279,38 @@ def make_callback_handler(settings: Settings) -> CallbackQueryHandler:
             )
             return
 
+        # --- Digest detail buttons ---
+        if data.startswith("detail_"):
+            account_id = data.replace("detail_", "")
+            try:
+                d = await aio.get_daily_insights(account_id)
+                text = formatters.format_daily_report(account_id, d)
+            except Exception as e:
+                text = formatters.format_error(f"Error for {account_id}: {e}")
+            await query.message.reply_text(text, parse_mode="MarkdownV2")
+            return
+
         # --- Account selection ---
         if data.startswith("selacct_campaigns_"):
             account_id = data.replace("selacct_campaigns_", "")
             await _show_campaigns_cb(query, context, account_id)
             return
 
+        if data.startswith("selacct_drill_"):
+            account_id = data.replace("selacct_drill_", "")
+            await _show_drilldown_cb(query, account_id)
+            return
+
+        # --- Drill-down level / breakdown switches ---
+        if data.startswith("drill_"):
+            parts = data.split("_", 3)  # drill, level, breakdown, account
+            if len(parts) == 4:
+                level, breakdown, account_id = parts[1], parts[2], parts[3]
+                await _show_drilldown_cb(
+                    query, account_id, level, None if breakdown == "none" else breakdown
+                )
+            return
+
         # --- Entity selection ---
         if data.startswith("select_"):
             parts = data.split("_", 2)  # select, type, id
@@ -271,6 +331,23 @@ def make_callback_handler(settings: Settings) -> CallbackQueryHandler:
             await _show_ads(query, context, adset_id)
             return
 
+        # --- Entity list pages ---
+        if data.startswith("page_"):
+            parts = data.split("_", 2)  # page, type, parent_number
+            if len(parts) == 3 and "_" in parts[2]:
+                parent_id, number = parts[2].rsplit("_", 1)
+                show = {
+                    "campaign": _show_campaigns_cb,
+                    "adset": _show_adsets,
+                    "ad": _show_ads,
+                }.get(parts[1])
+                if show is not None and number.isdigit():
+                    await show(query, context, parent_id, int(number))
+            return
+
+        if data == "noop":
+            return
+
         # --- Pause ---
         if data.startswith("pause_"):
             parts = data.split("_", 2)
@@ -319,45 +396,77 @@ def make_callback_handler(settings: Settings) -> CallbackQueryHandler:
     return CallbackQueryHandler(handle_callback)
 
 
-async def _show_campaigns_cb(query, context, account_id: str) -> None:
+async def _show_campaigns_cb(query, context, account_id: str, number: int = 0) -> None:
     try:
-        camps = management.list_campaigns(account_id)
+        page = await paging.entity_page(
+            context.user_data, "campaign", account_id, number
+        )
     except Exception as e:
         await query.edit_message_text(
             formatters.format_error(str(e)), parse_mode="MarkdownV2"
         )
         return
 
-    if not camps:
+    if not page.items:
         await query.edit_message_text("No campaigns found\\.", parse_mode="MarkdownV2")
         return
 
     context.user_data["current_account"] = account_id
     await query.edit_message_text(
         f"Campaigns for `{formatters._esc(account_id)}`:",
-        reply_markup=keyboards.entity_list(camps, "campaign"),
+        reply_markup=keyboards.entity_list(
+            page.items,
+            "campaign",
+            parent_id=account_id,
+            page=page.number,
+            has_next=page.has_next,
+            pages=page.total_pages,
+        ),
         parse_mode="MarkdownV2",
     )
+    paging.prefetch_tree(account_id)
 
 
-async def _show_entity_actions(query, context, entity_type: str, entity_id: str) -> None:
-    """Show action menu for a campaign/adset/ad."""
+async def _show_drilldown_cb(
+    query, account_id: str, level: str = "campaign", breakdown: str | None = None
+) -> None:
+    await query.edit_message_text("Fetching drill\\-down\\.\\.\\.", parse_mode="MarkdownV2")
     try:
-        if entity_type == "campaign":
-            items = management.list_campaigns(context.user_data.get("current_account", ""))
-        elif entity_type == "adset":
-            # Find the parent campaign from user_data
-            items = management.list_adsets(context.user_data.get("current_campaign", ""))
-        else:
-            items = management.list_ads(context.user_data.get("current_adset", ""))
-
-        entity = next((e for e in items if e["id"] == entity_id), None)
+        table = await aio.get_breakdown_table(account_id, level, breakdown)
     except Exception as e:
         await query.edit_message_text(
             formatters.format_error(str(e)), parse_mode="MarkdownV2"
         )
         return
 
+    await query.edit_message_text(
+        formatters.format_drilldown(account_id, level, breakdown, table),
+        reply_markup=keyboards.drilldown_menu(account_id, level, breakdown),
+        parse_mode="MarkdownV2",
+    )
+
+
+async def _show_entity_actions(query, context, entity_type: str, entity_id: str) -> None:
+    """Show action menu for a campaign/adset/ad."""
+    entity = entities.get(entity_type, entity_id)
+    if entity is None:
+        # Not cached (e.g. after a restart or an update): re-list the parent
+        try:
+            if entity_type == "campaign":
+                items = await aio.list_campaigns(context.user_data.get("current_account", ""))
+            elif entity_type == "adset":
+                # Find the parent campaign from user_data
+                items = await aio.list_adsets(context.user_data.get("current_campaign", ""))
+            else:
+                items = await aio.list_ads(context.user_data.get("current_adset", ""))
+
+            entity = next((e for e in items if e["id"] == entity_id), None)
+        except Exception as e:
+            await query.edit_message_text(
+                formatters.format_error(str(e)), parse_mode="MarkdownV2"
+            )
+            return
+
     if entity is None:
         await query.edit_message_text("Entity not found\\.", parse_mode="MarkdownV2")
         return
@@ -384,45 +493,63 @@ async def _show_entity_actions(query, context, entity_type: str, entity_id: str)
     )
 
 
-async def _show_adsets(query, context, campaign_id: str) -> None:
+async def _show_adsets(query, context, campaign_id: str, number: int = 0) -> None:
     context.user_data["current_campaign"] = campaign_id
     try:
-        adsets = management.list_adsets(campaign_id)
+        page = await paging.entity_page(
+            context.user_data, "adset", campaign_id, number
+        )
     except Exception as e:
         await query.edit_message_text(
             formatters.format_error(str(e)), parse_mode="MarkdownV2"
         )
         return
 
-    if not adsets:
+    if not page.items:
         await query.edit_message_text("No ad sets found\\.", parse_mode="MarkdownV2")
         return
 
     parent_cb = f"select_campaign_{campaign_id}"
     await query.edit_message_text(
         "Ad Sets:",
-        reply_markup=keyboards.entity_list(adsets, "adset", parent_cb),
+        reply_markup=keyboards.entity_list(
+            page.items,
+            "adset",
+            parent_cb,
+            parent_id=campaign_id,
+            page=page.number,
+            has_next=page.has_next,
+            pages=page.total_pages,
+        ),
     )
 
 
-async def _show_ads(query, context, adset_id: str) -> None:
+async def _show_ads(query, context, adset_id: str, number: int = 0) -> None:
     context.user_data["current_adset"] = adset_id
     try:
-        ads = management.list_ads(adset_id)
+        page = await paging.entity_page(context.user_data, "ad", adset_id, number)
     except Exception as e:
         await query.edit_message_text(
             formatters.format_error(str(e)), parse_mode="MarkdownV2"
         )
         return
 
-    if not ads:
+    if not page.items:
         await query.edit_message_text("No ads found\\.", parse_mode="MarkdownV2")
         return
 
     parent_cb = f"select_adset_{adset_id}"
     await query.edit_message_text(
         "Ads:",
-        reply_markup=keyboards.entity_list(ads, "ad", parent_cb),
+        reply_markup=keyboards.entity_list(
+            page.items,
+            "ad",
+            parent_cb,
+            parent_id=adset_id,
+            page=page.number,
+            has_next=page.has_next,
+            pages=page.total_pages,
+        ),
     )
 
 
@@ -436,7 +563,7 @@ async def _handle_confirm(query, context, remainder: str) -> None:
 
     try:
         if action == "pause":
-            management.update_status(entity_type, entity_id, "PAUSED")
+            await aio.update_status(entity_type, entity_id, "PAUSED")
             await query.edit_message_text(
                 formatters.format_success(
                     f"{entity_type.title()} paused successfully"
@@ -444,7 +571,7 @@ async def _handle_confirm(query, context, remainder: str) -> None:
                 parse_mode="MarkdownV2",
             )
         elif action == "resume":
-            management.update_status(entity_type, entity_id, "ACTIVE")
+            await aio.update_status(entity_type, entity_id, "ACTIVE")
             await query.edit_message_text(
                 formatters.format_success(
                     f"{entity_type.title()} resumed successfully"
@@ -459,7 +586,7 @@ async def _handle_confirm(query, context, remainder: str) -> None:
                     parse_mode="MarkdownV2",
                 )
                 return
-            management.update_budget(entity_type, entity_id, amount)
+            await aio.update_budget(entity_type, entity_id, amount)
             await query.edit_message_text(
                 formatters.format_success(
                     f"Budget updated to ${amount:.2f}"
@@ -503,19 +630,30 @@ async def _handle_ads_generate(query, context) -> None:
         parse_mode="MarkdownV2",
     )
 
+    # Progress edits are fired without waiting so generation never blocks
+    # on Telegram; the outbound limiter drops edits superseded by newer ones.
+    progress: list[asyncio.Task] = []
+
+    async def edit_progress(text: str) -> None:
+        try:
+            await status_msg.edit_text(text, parse_mode="MarkdownV2")
+        except TelegramError as e:
+            logger.warning("Progress update failed: %s", e)
+
     async def progress_callback(current, total, hook_text, size):
         esc_hook = formatters._esc(hook_text[:30])
         esc_size = formatters._esc(size)
-        try:
-            await status_msg.edit_text(
-                f"🎨 Generating images\\.\\.\\.\n\n"
-                f"{current}/{total}: {esc_hook} \\({esc_size}\\)",
-                parse_mode="MarkdownV2",
+        progress.append(
+            asyncio.create_task(
+                edit_progress(
+                    f"🎨 Generating images\\.\\.\\.\n\n"
+                    f"{current}/{total}: {esc_hook} \\({esc_size}\\)"
+                )
             )
-        except Exception:
-            pass  # Telegram may rate-limit edits
+        )
 
     results = await medspa.run_generation(hooks, offer, progress_callback)
+    await asyncio.gather(*progress)
 
     if not results:
         await status_msg.edit_text(
@@ -0,0 +1,236 @@
+"""Weekly trend charts rendered server-side as PNG images.
+
+Each account gets one compact image: daily spend as bars with a leads
+sparkline on top, the same two series the dashboard plots. Rendering uses
+Pillow and NumPy only (no network, no GPU). Images are cached by a hash
+of the data they show, so unchanged weeks are not drawn again, and all
+accounts are rendered in a single thread job before being sent as media
+groups. That job runs in asyncio's default executor, not the Graph API
+worker pool, so drawing never holds a slot an API call could use.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import io
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Any
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from telegram import Bot, InputMediaPhoto
+
+from src.facebook import aio, planner
+from src.facebook.fanout import fetch_accounts
+
+logger = logging.getLogger("fb-ads-bot")
+
+CHART_DAYS = 7
+CHART_WIDTH, CHART_HEIGHT = 480, 200
+CHART_CACHE_SIZE = 256
+# zlib level for PNG output: flat-colour charts compress well even at 1
+PNG_COMPRESS_LEVEL = 1
+# Telegram accepts 2-10 photos per media group
+MEDIA_GROUP_MAX = 10
+
+# Dashboard palette (dashboard/index.html)
+BACKGROUND = (15, 23, 42)
+TEXT = (226, 232, 240)
+MUTED = (148, 163, 184)
+SPEND_COLOR = (59, 130, 246)
+LEADS_COLOR = (34, 197, 94)
+
+_PAD, _TITLE_H, _LABEL_H = 12, 40, 16
+
+_cache: OrderedDict[str, bytes] = OrderedDict()
+_cache_lock = threading.Lock()
+_font = ImageFont.load_default()
+
+
+# --- Data ---
+
+
+async def collect(
+    account_ids: list[str], days: int = CHART_DAYS
+) -> list[tuple[str, list[dict[str, Any]] | Exception]]:
+    """The last `days` daily rows of every account, fetched concurrently."""
+
+    async def fetch(account_id: str) -> list[dict[str, Any]]:
+        since, until = planner.last_days(account_id, days)
+        return await aio.get_daily_series(
+            account_id, since.isoformat(), until.isoformat()
+        )
+
+    return [(acct, rows) async for acct, rows in fetch_accounts(account_ids, fetch)]
+
+
+def daily_values(
+    rows: list[dict[str, Any]], since: date, until: date
+) -> tuple[list[date], np.ndarray, np.ndarray]:
+    """Spend and leads per day of the window, zero on days without delivery."""
+    n = (until - since).days + 1
+    dates = [since + timedelta(days=i) for i in range(n)]
+    spend, leads = np.zeros(n), np.zeros(n)
+    for row in rows:
+        i = (date.fromisoformat(row["date_start"]) - since).days
+        if 0 <= i < n:
+            spend[i] = row["spend"]
+            leads[i] = row["leads"]
+    return dates, spend, leads
+
+
+def chart_series(
+    results: list[tuple[str, list[dict[str, Any]] | Exception]],
+    days: int = CHART_DAYS,
+) -> list[tuple[str, list[date], np.ndarray, np.ndarray]]:
+    """render_charts() input for fetched series; failed accounts are skipped."""
+    series = []
+    for acct, rows in results:
+        if isinstance(rows, Exception):
+            logger.warning("No chart for %s: %s", acct, rows)
+            continue
+        name = rows[-1]["account_name"] if rows else acct
+        series.append((name, *daily_values(rows, *planner.last_days(acct, days))))
+    return series
+
+
+def chart_caption(days: int = CHART_DAYS) -> str:
+    return f"📈 Last {days} days: spend (bars) and leads (line)"
+
+
+# --- Rendering ---
+
+
+def render_chart(
+    name: str, dates: list[date], spend: np.ndarray, leads: np.ndarray
+) -> bytes:
+    """PNG of daily spend bars and a leads sparkline, cached by content."""
+    key = _data_hash(name, dates, spend, leads)
+    with _cache_lock:
+        png = _cache.get(key)
+        if png is not None:
+            _cache.move_to_end(key)
+            return png
+
+    png = _draw(name, dates, spend, leads)
+    with _cache_lock:
+        _cache[key] = png
+        while len(_cache) > CHART_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return png
+
+
+def render_charts(
+    series: list[tuple[str, list[date], np.ndarray, np.ndarray]],
+) -> list[bytes]:
+    """Render many accounts at once, e.g. in one worker-pool job."""
+    return [render_chart(*item) for item in series]
+
+
+def _data_hash(
+    name: str, dates: list[date], spend: np.ndarray, leads: np.ndarray
+) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(name.encode())
+    h.update(dates[0].isoformat().encode() if dates else b"")
+    h.update(np.ascontiguousarray(spend, dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(leads, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+def _draw(
+    name: str, dates: list[date], spend: np.ndarray, leads: np.ndarray
+) -> bytes:
+    img = _base(tuple(dates)).copy()
+    draw = ImageDraw.Draw(img)
+
+    draw.text((_PAD, _PAD - 4), name[:48], fill=TEXT, font=_font)
+    summary = f"Spend ${spend.sum():,.2f}   Leads {int(leads.sum()):,}"
+    draw.text((_PAD, _PAD + 12), summary, fill=MUTED, font=_font)
+
+    n = len(dates)
+    if n:
+        top, bottom, centers, slot = _geometry(n)
+        height = bottom - top
+        # Bar and sparkline geometry for all days at once
+        bar_tops = bottom - height * _scale(spend)
+        spark_ys = bottom - height * _scale(leads)
+        half = max(slot * 0.3, 1.0)
+        for x, y in zip(centers.tolist(), bar_tops.tolist()):
+            if y < bottom:
+                draw.rectangle((x - half, y, x + half, bottom), fill=SPEND_COLOR)
+        points = list(zip(centers.tolist(), spark_ys.tolist()))
+        if n > 1:
+            draw.line(points, fill=LEADS_COLOR, width=2, joint="curve")
+        for x, y in points:
+            draw.ellipse((x - 2.5, y - 2.5, x + 2.5, y + 2.5), fill=LEADS_COLOR)
+
+    out = io.BytesIO()
+    img.save(out, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+    return out.getvalue()
+
+
+@functools.lru_cache(maxsize=8)
+def _base(dates: tuple[date, ...]) -> Image.Image:
+    """Background with the day labels, shared by every chart of a window."""
+    img = Image.new("RGB", (CHART_WIDTH, CHART_HEIGHT), BACKGROUND)
+    draw = ImageDraw.Draw(img)
+    n = len(dates)
+    if n:
+        _, bottom, centers, _ = _geometry(n)
+        for i in range(0, n, max(1, n // 10)):
+            label = dates[i].strftime("%d.%m")
+            width = draw.textlength(label, font=_font)
+            draw.text(
+                (centers[i] - width / 2, bottom + 4), label, fill=MUTED, font=_font
+            )
+    return img
+
+
+def _geometry(n: int) -> tuple[int, int, np.ndarray, float]:
+    """Plot top and bottom, x centre of each day and the width per day."""
+    top = _TITLE_H + _PAD
+    bottom = CHART_HEIGHT - _LABEL_H - _PAD
+    slot = (CHART_WIDTH - 2 * _PAD) / n
+    return top, bottom, _PAD + slot * (np.arange(n) + 0.5), slot
+
+
+def _scale(values: np.ndarray) -> np.ndarray:
+    """Values as fractions of their maximum (all zeros if nothing)."""
+    peak = values.max() if len(values) else 0.0
+    return values / peak if peak > 0 else np.zeros_like(values)
+
+
+# --- Sending ---
+
+
+async def send_weekly_charts(
+    bot: Bot, chat_id: int, account_ids: list[str], days: int = CHART_DAYS
+) -> None:
+    """Fetch, render and send one chart per account as media groups.
+
+    Accounts whose series could not be fetched are logged and skipped.
+    """
+    series = chart_series(await collect(account_ids, days), days)
+    if not series:
+        return
+
+    images = await asyncio.to_thread(render_charts, series)
+    caption = chart_caption(days)
+    for start in range(0, len(images), MEDIA_GROUP_MAX):
+        chunk = images[start : start + MEDIA_GROUP_MAX]
+        first_caption = caption if start == 0 else None
+        if len(chunk) == 1:
+            await bot.send_photo(chat_id=chat_id, photo=chunk[0], caption=first_caption)
+            continue
+        await bot.send_media_group(
+            chat_id=chat_id,
+            media=[
+                InputMediaPhoto(png, caption=first_caption if i == 0 else None)
+                for i, png in enumerate(chunk)
+            ],
+        )
@@ -0,0 +1,46 @@
+"""Daily report as one multi-account digest.
+
+All accounts are fetched concurrently and summarised in a compact table
+that goes out in as few messages as the length limit allows, with inline
+buttons that open each account's full report on demand.
+"""
+from __future__ import annotations
+
+from typing import Any
+
+from telegram import Bot
+
+from src.bot import formatters, keyboards
+from src.facebook import aio
+from src.facebook.fanout import fetch_accounts
+
+
+async def collect(
+    account_ids: list[str],
+) -> list[tuple[str, dict[str, Any] | None | Exception]]:
+    """Yesterday's insights for every account, fetched concurrently."""
+    return [
+        (acct, data)
+        async for acct, data in fetch_accounts(account_ids, aio.get_daily_insights)
+    ]
+
+
+async def send_digest(
+    bot: Bot,
+    chat_id: int,
+    results: list[tuple[str, dict[str, Any] | None | Exception]],
+) -> None:
+    messages = formatters.format_digest(results)
+    details = [
+        (acct, data["account_name"])
+        for acct, data in results
+        if isinstance(data, dict)
+    ]
+    markup = keyboards.digest_details(details) if details else None
+    for i, text in enumerate(messages):
+        await bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            parse_mode="MarkdownV2",
+            reply_markup=markup if i == len(messages) - 1 else None,
+        )
@@ -1,88 +1,196 @@
 from __future__ import annotations
 
+import functools
 from typing import Any
 
-
-def format_daily_report(account_id: str, data: dict[str, Any] | None) -> str:
+from src.bot.packer import MAX_MESSAGE_LENGTH, pack
+from src.bot.templates import Layout, escape_many, escape_markdown
+from src.facebook.insight_table import InsightTable
+from src.facebook.insights import BREAKDOWNS, LEVEL_FIELDS
+
+LEVEL_LABELS = {"campaign": "Campaigns", "adset": "Ad sets", "ad": "Ads"}
+BREAKDOWN_LABELS = {"age": "Age", "gender": "Gender", "placement": "Placement"}
+DRILLDOWN_TOP = 10
+DIGEST_NAME_WIDTH = 18
+
+# Distinct strings (account IDs, names, dates) whose escaped form is kept
+ESC_CACHE_SIZE = 4096
+
+# --- Layouts ---
+# Written once for every output (see src/bot/templates.py); `output` is
+# "markdown" (Telegram MarkdownV2), "html" or "plain".
+
+DAILY_LAYOUT = Layout(
+    "*{account_name}*  (`{account_id}`)",
+    "Date: {date_start}",
+    "",
+    "Impressions: *{impressions:,}*",
+    "Clicks: *{clicks:,}*",
+    "CPM: *{cpm:$.2f}*",
+    "Frequency: *{frequency:.2f}*",
+    "Spend: *{spend:$.2f}*",
+    "Leads: *{leads}*",
+    ("CPL: *{cpl:$.2f}*", "CPL: *N/A* (no leads)"),
+)
+DAILY_EMPTY_LAYOUT = Layout("*{account_id}*", "No data for yesterday.")
+
+WEEKLY_METRICS = [
+    ("Impressions", "impressions", False),
+    ("Clicks", "clicks", False),
+    ("CPM", "cpm", True),
+    ("Frequency", "frequency", False),
+    ("Spend", "spend", True),
+    ("Leads", "leads", False),
+    ("CPL", "cpl", True),
+]
+WEEKLY_LAYOUT = Layout(
+    "*{account_name}* — 7-day summary",
+    "{date_start} → {date_stop}",
+    "",
+    *(
+        (
+            f"{label}: *{{{key}:{spec}}}* {{{key}_arrow}} {{{key}_pct:+.1f}}%",
+            f"{label}: *{{{key}:{spec}}}*",
+            f"{label}: N/A",
+        )
+        for label, key, is_dollar in WEEKLY_METRICS
+        for spec in ["$.2f" if is_dollar else "num"]
+    ),
+)
+WEEKLY_EMPTY_LAYOUT = Layout("*{account_id}*", "No data for current period.")
+
+_BUDGET_LINES = (
+    ("Daily budget: {daily_budget:$.2f}", None),
+    ("Lifetime budget: {lifetime_budget:$.2f}", None),
+)
+ENTITY_EXTRA_LINES = {
+    "campaign": (*_BUDGET_LINES, ("Objective: {objective}", None)),
+    "adset": _BUDGET_LINES,
+    "ad": (),
+}
+# One layout per entity type and status emoji, rendered from the entity as is
+ENTITY_LAYOUTS = {
+    (entity_type, emoji): Layout(f"{emoji} *{{name}}*", "Status: {status}", *extra)
+    for entity_type, extra in ENTITY_EXTRA_LINES.items()
+    for emoji in ("🟢", "🔴")
+}
+
+
+def format_daily_report(
+    account_id: str, data: dict[str, Any] | None, output: str = "markdown"
+) -> str:
     if data is None:
-        return f"*{_esc(account_id)}*\nNo data for yesterday\\."
-
-    name = _esc(data["account_name"])
-    impressions = _esc(f"{data['impressions']:,}")
-    clicks = _esc(f"{data['clicks']:,}")
-    cpm = _esc(f"${data['cpm']:.2f}")
-    frequency = _esc(f"{data['frequency']:.2f}")
-    spend = _esc(f"${data['spend']:.2f}")
-    leads = _esc(str(data['leads']))
-
-    lines = [
-        f"*{name}*  \\(`{_esc(account_id)}`\\)",
-        f"Date: {_esc(data['date_start'])}",
-        "",
-        f"Impressions: *{impressions}*",
-        f"Clicks: *{clicks}*",
-        f"CPM: *{cpm}*",
-        f"Frequency: *{frequency}*",
-        f"Spend: *{spend}*",
-        f"Leads: *{leads}*",
-    ]
-    if data["cpl"] is not None:
-        cpl = _esc(f"${data['cpl']:.2f}")
-        lines.append(f"CPL: *{cpl}*")
-    else:
-        lines.append("CPL: *N/A* \\(no leads\\)")
-
-    return "\n".join(lines)
+        return DAILY_EMPTY_LAYOUT.render({"account_id": account_id}, output)
+    return DAILY_LAYOUT.render({**data, "account_id": account_id}, output)
+
+
+def format_daily_csv(results: list[tuple[str, dict[str, Any] | None]]) -> str:
+    """Yesterday's metrics for many accounts as CSV, one row per account."""
+    return DAILY_LAYOUT.csv(
+        {**data, "account_id": acct} for acct, data in results if data is not None
+    )
+
+
+def format_digest(
+    results: list[tuple[str, dict[str, Any] | None | Exception]],
+) -> list[str]:
+    """Compact table of yesterday's metrics for many accounts.
+
+    Returns as few messages as possible: the table is only split, with
+    its header repeated, where a message would exceed MAX_MESSAGE_LENGTH.
+    """
+    dates = [d["date_start"] for _, d in results if isinstance(d, dict)]
+    title = "📊 *Daily digest*"
+    if dates:
+        title += f" — {_esc(dates[0])}"
+
+    header = (
+        f"{'Account':<{DIGEST_NAME_WIDTH}} {'Spend':>11} {'Leads':>6} {'CPL':>8}"
+    )
+    rows, notes = [], []
+    spend = leads = 0
+    for acct, data in results:
+        if isinstance(data, Exception):
+            notes.append(f"❌ {_esc(acct)}: {_esc(str(data))}")
+            continue
+        if data is None:
+            notes.append(f"➖ {_esc(acct)}: no data")
+            continue
+        spend += data["spend"]
+        leads += data["leads"]
+        rows.append(
+            _digest_row(
+                data["account_name"], data["spend"], data["leads"], data["cpl"]
+            )
+        )
+    if len(rows) > 1:
+        rows.append(
+            _digest_row("TOTAL", spend, leads, spend / leads if leads else None)
+        )
+
+    table = _pre(title + "\n", header, rows) if rows else title
+    return list(pack([table, *notes], MAX_MESSAGE_LENGTH))
 
 
 def format_weekly_report(
-    account_id: str, comparison: dict[str, dict[str, Any] | None]
+    account_id: str,
+    comparison: dict[str, dict[str, Any] | None],
+    output: str = "markdown",
 ) -> str:
     current = comparison.get("current")
     previous = comparison.get("previous")
 
     if current is None:
-        return f"*{_esc(account_id)}*\nNo data for current period\\."
-
-    name = _esc(current["account_name"])
-    header = f"*{name}* — 7\\-day summary"
-
-    metrics = [
-        ("Impressions", "impressions", False),
-        ("Clicks", "clicks", False),
-        ("CPM", "cpm", True),
-        ("Frequency", "frequency", False),
-        ("Spend", "spend", True),
-        ("Leads", "leads", False),
-        ("CPL", "cpl", True),
-    ]
-
-    lines = [header, f"{_esc(current['date_start'])} → {_esc(current['date_stop'])}", ""]
-    for label, key, is_dollar in metrics:
-        cur_val = current.get(key)
-        prev_val = previous.get(key) if previous else None
-        lines.append(_metric_line(label, cur_val, prev_val, is_dollar))
+        return WEEKLY_EMPTY_LAYOUT.render({"account_id": account_id}, output)
 
-    return "\n".join(lines)
+    values = dict(current)
+    for _, key, _ in WEEKLY_METRICS:
+        prev = previous.get(key) if previous else None
+        values[f"{key}_arrow"], values[f"{key}_pct"] = _trend(current.get(key), prev)
+    return WEEKLY_LAYOUT.render(values, output)
 
 
-def format_entity_info(entity: dict[str, Any], entity_type: str) -> str:
-    status_emoji = "🟢" if entity["status"] == "ACTIVE" else "🔴"
-    name = _esc(entity["name"])
-    lines = [f"{status_emoji} *{name}*", f"Status: {_esc(entity['status'])}"]
+def format_drilldown(
+    account_id: str,
+    level: str,
+    breakdown: str | None,
+    table: InsightTable,
+    days: int = 7,
+) -> str:
+    """Top entities at `level` by spend, plus a breakdown roll-up if any."""
+    header = (
+        f"🔎 *{_esc(LEVEL_LABELS[level])}* for `{_esc(account_id)}` "
+        f"\\(last {days} days\\)"
+    )
+    if not len(table):
+        return f"{header}\nNo data for this period\\."
+
+    totals = table.totals()
+    lines = [header, _drill_summary("Total", totals), ""]
+
+    if breakdown:
+        cols = BREAKDOWNS[breakdown]
+        lines.append(f"*By {_esc(BREAKDOWN_LABELS[breakdown].lower())}*")
+        for row in table.rollup(cols).top(DRILLDOWN_TOP).records():
+            label = " / ".join(row[c] or "unknown" for c in cols)
+            lines.append(_drill_summary(label, row))
+        lines.append("")
+
+    id_col, name_col = LEVEL_FIELDS[level]
+    lines.append(f"*Top {_esc(LEVEL_LABELS[level].lower())} by spend*")
+    ranked = table.rollup([id_col, name_col]).top(DRILLDOWN_TOP).records()
+    for i, row in enumerate(ranked, 1):
+        lines.append(_drill_summary(f"{i}. {row[name_col][:40]}", row))
 
-    if entity_type in ("campaign", "adset"):
-        db = entity.get("daily_budget")
-        lb = entity.get("lifetime_budget")
-        if db is not None:
-            lines.append(f"Daily budget: {_esc(f'${db:.2f}')}")
-        if lb is not None:
-            lines.append(f"Lifetime budget: {_esc(f'${lb:.2f}')}")
+    return "\n".join(lines)
 
-    if entity_type == "campaign" and entity.get("objective"):
-        lines.append(f"Objective: {_esc(entity['objective'])}")
 
-    return "\n".join(lines)
+def format_entity_info(
+    entity: dict[str, Any], entity_type: str, output: str = "markdown"
+) -> str:
+    emoji = "🟢" if entity["status"] == "ACTIVE" else "🔴"
+    layout = ENTITY_LAYOUTS.get((entity_type, emoji)) or ENTITY_LAYOUTS["ad", emoji]
+    return layout.render(entity, output)
 
 
 def format_success(msg: str) -> str:
@@ -96,33 +204,50 @@ def format_error(msg: str) -> str:
 # --- Helpers ---
 
 
-def _esc(text: str) -> str:
+def _esc(text: Any) -> str:
     """Escape MarkdownV2 special characters."""
-    special = r"_*[]()~`>#+-=|{}.!"
-    out = []
-    for ch in str(text):
-        if ch in special:
-            out.append(f"\\{ch}")
-        else:
-            out.append(ch)
-    return "".join(out)
-
-
-def _metric_line(
-    label: str, cur: float | int | None, prev: float | int | None, is_dollar: bool
-) -> str:
-    if cur is None:
-        return f"{label}: N/A"
+    return _esc_str(str(text))
+
+
+@functools.lru_cache(maxsize=ESC_CACHE_SIZE)
+def _esc_str(text: str) -> str:
+    return escape_markdown(text)
+
+
+def _esc_many(*fields: Any) -> list[str]:
+    """Escape many fields in one pass over their joined text."""
+    return escape_many([str(field) for field in fields])
+
+
+def _trend(
+    cur: float | int | None, prev: float | int | None
+) -> tuple[str | None, float | None]:
+    """(arrow, percent change) versus the previous period, if comparable."""
+    if cur is None or prev is None or prev == 0:
+        return None, None
+    pct = ((cur - prev) / prev) * 100
+    arrow = "📈" if pct > 0 else "📉" if pct < 0 else "➡️"
+    return arrow, pct
+
+
+def _drill_summary(label: str, row: dict[str, Any]) -> str:
+    spend = _esc(f"${row['spend']:,.2f}")
+    leads = _esc(f"{int(row['leads']):,}")
+    cpl = _esc(f"${row['cpl']:.2f}") if row["cpl"] is not None else "N/A"
+    return f"{_esc(label)}: *{spend}* · {leads} leads · CPL {cpl}"
+
 
-    if is_dollar:
-        cur_str = _esc(f"${cur:.2f}")
-    else:
-        cur_str = _esc(f"{cur:,.2f}" if isinstance(cur, float) else f"{cur:,}")
+def _digest_row(name: str, spend: float, leads: int, cpl: float | None) -> str:
+    name = name[:DIGEST_NAME_WIDTH]
+    cpl_str = f"${cpl:,.2f}" if cpl is not None else "-"
+    return (
+        f"{name:<{DIGEST_NAME_WIDTH}} {f'${spend:,.2f}':>11} "
+        f"{leads:>6,} {cpl_str:>8}"
+    )
 
-    if prev is not None and prev != 0:
-        pct = ((cur - prev) / prev) * 100
-        arrow = "📈" if pct > 0 else "📉" if pct < 0 else "➡️"
-        pct_str = _esc(f"{pct:+.1f}")
-        return f"{label}: *{cur_str}* {arrow} {pct_str}%"
 
-    return f"{label}: *{cur_str}*"
+def _pre(prefix: str, header: str, rows: list[str]) -> str:
+    """A MarkdownV2 code block; only ` and \\ need escaping inside it."""
+    body = "\n".join([header] + rows)
+    body = body.replace("\\", "\\\\").replace("`", "\\`")
+    return f"{prefix}```\n{body}\n```"
@@ -6,9 +6,10 @@ from telegram import Update
 from telegram.ext import ContextTypes
 
 from config.settings import Settings
-from src.bot import formatters, keyboards, medspa
+from src.bot import charts, digest, formatters, keyboards, medspa, paging
 from src.bot.notion_sync import sync_clients
-from src.facebook import insights, management
+from src.facebook import aio
+from src.facebook.fanout import fetch_accounts
 
 logger = logging.getLogger("fb-ads-bot")
 
@@ -53,9 +54,16 @@ def register_handlers(app, settings: Settings) -> None:
     @auth
     async def report_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Fetching daily report\\.\\.\\.", parse_mode="MarkdownV2")
-        for acct in settings.ad_account_ids:
+        if settings.report_mode == "digest":
+            results = await digest.collect(settings.ad_account_ids)
+            await digest.send_digest(context.bot, update.effective_chat.id, results)
+            return
+        async for acct, data in fetch_accounts(
+            settings.ad_account_ids, aio.get_daily_insights
+        ):
             try:
-                data = insights.get_daily_insights(acct)
+                if isinstance(data, Exception):
+                    raise data
                 text = formatters.format_daily_report(acct, data)
             except Exception as e:
                 text = formatters.format_error(f"Error for {acct}: {e}")
@@ -64,13 +72,22 @@ def register_handlers(app, settings: Settings) -> None:
     @auth
     async def weekly_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Fetching weekly comparison\\.\\.\\.", parse_mode="MarkdownV2")
-        for acct in settings.ad_account_ids:
+        async for acct, comp in fetch_accounts(
+            settings.ad_account_ids, aio.get_comparison_insights
+        ):
             try:
-                comp = insights.get_comparison_insights(acct, days=7)
+                if isinstance(comp, Exception):
+                    raise comp
                 text = formatters.format_weekly_report(acct, comp)
             except Exception as e:
                 text = formatters.format_error(f"Error for {acct}: {e}")
             await update.message.reply_text(text, parse_mode="MarkdownV2")
+        try:
+            await charts.send_weekly_charts(
+                context.bot, update.effective_chat.id, settings.ad_account_ids
+            )
+        except Exception:
+            logger.exception("Weekly charts failed")
 
     @auth
     async def campaigns_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -83,6 +100,17 @@ def register_handlers(app, settings: Settings) -> None:
                 reply_markup=keyboards.account_selector(accts, "selacct_campaigns"),
             )
 
+    @auth
+    async def drilldown_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        accts = settings.ad_account_ids
+        if len(accts) == 1:
+            await _show_drilldown(update, accts[0])
+        else:
+            await update.message.reply_text(
+                "Select an account:",
+                reply_markup=keyboards.account_selector(accts, "selacct_drill"),
+            )
+
     @auth
     async def generate_ads_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         state = medspa.load_state()
@@ -129,6 +157,7 @@ def register_handlers(app, settings: Settings) -> None:
             "/report — Yesterday's metrics\n"
             "/weekly — 7\\-day comparison\n"
             "/campaigns — Manage campaigns\n"
+            "/drilldown — Spend and leads by ad set, ad, age or placement\n"
             "/generate\\_ads — Generate med\\-spa ad images\n"
             "/sync — Refresh client list from Notion\n"
             "/help — This message"
@@ -180,6 +209,7 @@ def register_handlers(app, settings: Settings) -> None:
     app.add_handler(CommandHandler("campaigns", campaigns_cmd))
     app.add_handler(CommandHandler("adsets", campaigns_cmd))  # alias
     app.add_handler(CommandHandler("ads", campaigns_cmd))  # alias
+    app.add_handler(CommandHandler("drilldown", drilldown_cmd))
     app.add_handler(CommandHandler("generate_ads", generate_ads_cmd))
     app.add_handler(CommandHandler("sync", sync_cmd))
     app.add_handler(CommandHandler("help", help_cmd))
@@ -201,20 +231,50 @@ async def _show_campaigns(
     update: Update, context: ContextTypes.DEFAULT_TYPE, account_id: str
 ) -> None:
     try:
-        camps = management.list_campaigns(account_id)
+        page = await paging.entity_page(context.user_data, "campaign", account_id)
     except Exception as e:
         await update.message.reply_text(
             formatters.format_error(str(e)), parse_mode="MarkdownV2"
         )
         return
 
-    if not camps:
+    if not page.items:
         await update.message.reply_text("No campaigns found\\.", parse_mode="MarkdownV2")
         return
 
     context.user_data["current_account"] = account_id
     await update.message.reply_text(
         f"Campaigns for `{formatters._esc(account_id)}`:",
-        reply_markup=keyboards.entity_list(camps, "campaign"),
+        reply_markup=keyboards.entity_list(
+            page.items,
+            "campaign",
+            parent_id=account_id,
+            page=page.number,
+            has_next=page.has_next,
+            pages=page.total_pages,
+        ),
+        parse_mode="MarkdownV2",
+    )
+    paging.prefetch_tree(account_id)
+
+
+async def _show_drilldown(
+    update: Update,
+    account_id: str,
+    level: str = "campaign",
+    breakdown: str | None = None,
+) -> None:
+    await update.message.reply_text("Fetching drill\\-down\\.\\.\\.", parse_mode="MarkdownV2")
+    try:
+        table = await aio.get_breakdown_table(account_id, level, breakdown)
+    except Exception as e:
+        await update.message.reply_text(
+            formatters.format_error(str(e)), parse_mode="MarkdownV2"
+        )
+        return
+
+    await update.message.reply_text(
+        formatters.format_drilldown(account_id, level, breakdown, table),
+        reply_markup=keyboards.drilldown_menu(account_id, level, breakdown),
         parse_mode="MarkdownV2",
     )
@@ -17,6 +17,7 @@ def main_menu() -> InlineKeyboardMarkup:
                 InlineKeyboardButton("🎨 Generate Ads", callback_data="cmd_generate_ads"),
             ],
             [
+                InlineKeyboardButton("🔎 Drill-down", callback_data="cmd_drilldown"),
                 InlineKeyboardButton("ℹ️ Help", callback_data="cmd_help"),
             ],
         ]
@@ -39,8 +40,16 @@ def entity_list(
     items: list[dict[str, Any]],
     entity_type: str,
     parent_callback: str = "cmd_start",
+    parent_id: str = "",
+    page: int = 0,
+    has_next: bool = False,
+    pages: int | None = None,
 ) -> InlineKeyboardMarkup:
-    """Build a list of campaigns/adsets/ads with status emojis."""
+    """Build one page of campaigns/adsets/ads with status emojis.
+
+    `items` is only the visible page; if there are other pages, a
+    navigation row links to page_<entity_type>_<parent_id>_<n>.
+    """
     buttons = []
     for item in items:
         emoji = "🟢" if item["status"] == "ACTIVE" else "🔴"
@@ -48,6 +57,21 @@ def entity_list(
         cb = f"select_{entity_type}_{item['id']}"
         buttons.append([InlineKeyboardButton(label, callback_data=cb)])
 
+    if page > 0 or has_next:
+        prefix = f"page_{entity_type}_{parent_id}"
+        nav = []
+        if page > 0:
+            nav.append(
+                InlineKeyboardButton("‹ Prev", callback_data=f"{prefix}_{page - 1}")
+            )
+        position = f"{page + 1}/{pages}" if pages else f"Page {page + 1}"
+        nav.append(InlineKeyboardButton(position, callback_data="noop"))
+        if has_next:
+            nav.append(
+                InlineKeyboardButton("Next ›", callback_data=f"{prefix}_{page + 1}")
+            )
+        buttons.append(nav)
+
     buttons.append(
         [InlineKeyboardButton("« Back", callback_data=parent_callback)]
     )
@@ -115,6 +139,47 @@ def entity_actions(
     return InlineKeyboardMarkup(buttons)
 
 
+# Telegram rejects inline keyboards with more buttons than this
+MAX_BUTTONS = 100
+
+
+def digest_details(accounts: list[tuple[str, str]]) -> InlineKeyboardMarkup:
+    """One detail button per (account_id, label), two per row."""
+    buttons = [
+        InlineKeyboardButton(f"📋 {label[:24]}", callback_data=f"detail_{acct}")
+        for acct, label in accounts[:MAX_BUTTONS]
+    ]
+    return InlineKeyboardMarkup(
+        [buttons[i : i + 2] for i in range(0, len(buttons), 2)]
+    )
+
+
+def drilldown_menu(
+    account_id: str, level: str, breakdown: str | None
+) -> InlineKeyboardMarkup:
+    """Level and breakdown switches for the drill-down report."""
+    def button(label: str, lvl: str, bd: str | None, selected: bool):
+        return InlineKeyboardButton(
+            f"✅ {label}" if selected else label,
+            callback_data=f"drill_{lvl}_{bd or 'none'}_{account_id}",
+        )
+
+    levels = [("Campaigns", "campaign"), ("Ad Sets", "adset"), ("Ads", "ad")]
+    breakdowns = [
+        ("Total", None),
+        ("Age", "age"),
+        ("Gender", "gender"),
+        ("Placement", "placement"),
+    ]
+    return InlineKeyboardMarkup(
+        [
+            [button(label, lvl, breakdown, lvl == level) for label, lvl in levels],
+            [button(label, level, bd, bd == breakdown) for label, bd in breakdowns],
+            [InlineKeyboardButton("« Back", callback_data="cmd_start")],
+        ]
+    )
+
+
 def ads_client_selector(clients: list[dict]) -> InlineKeyboardMarkup:
     """Client picker for ad generation with stage emoji."""
     buttons = [
@@ -0,0 +1,229 @@
+"""Outbound Telegram rate limiting.
+
+Plugged into the Application as its rate limiter, so every Bot API call
+passes through here. Messages to a chat wait for a token from that chat's
+bucket and from a global bucket sized to Telegram's broadcast limit, so
+bursts go out at the highest allowed rate instead of failing with flood
+errors. A RetryAfter pauses the chat for the time Telegram asks and the
+request is retried. Queued edits of the same message are coalesced: a
+message has at most one edit waiting for a token, a newer edit replaces
+its text instead of queueing behind it, and every caller gets the result
+of the text that was sent.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Coroutine
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger("fb-ads-bot")
+
+# Telegram's documented limits: ~30 messages/s overall, ~1/s per private
+# chat (short bursts tolerated) and 20/minute per group.
+GLOBAL_RATE, GLOBAL_BURST = 30.0, 30
+CHAT_RATE, CHAT_BURST = 1.0, 3
+GROUP_RATE, GROUP_BURST = 20 / 60, 20
+MAX_RETRIES = 3
+# Messages whose pending edit is tracked for coalescing
+MAX_TRACKED_EDITS = 1000
+
+COALESCED_ENDPOINTS = {"editMessageText", "editMessageCaption"}
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations in arrival order.
+
+    reserve() takes a token immediately, going into debt if none is left,
+    and returns how long the caller must wait before using it.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+        self._tokens -= 1
+        wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        return max(wait, self._blocked_until - now)
+
+    def block(self, seconds: float) -> None:
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+@dataclass
+class _PendingEdit:
+    """The one queued edit of a message; newer edits replace its request."""
+
+    callback: Callable[..., Coroutine[Any, Any, Any]]
+    args: Any
+    kwargs: dict[str, Any]
+    future: asyncio.Future
+    sending: bool = False
+
+
+@dataclass
+class OutboxStats:
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    coalesced: int = 0
+    depth: int = 0
+    max_depth: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+
+class OutboundLimiter(BaseRateLimiter[int]):
+    """Per-chat and global token buckets with edit coalescing.
+
+    rate_limit_args, if given, overrides the number of RetryAfter retries.
+    """
+
+    def __init__(self, max_retries: int = MAX_RETRIES) -> None:
+        self.max_retries = max_retries
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        self._chats: dict[int | str, TokenBucket] = {}
+        self._edits: OrderedDict[tuple[Any, Any], _PendingEdit] = OrderedDict()
+        self._stats = OutboxStats()
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> dict[str, float]:
+        s = asdict(self._stats)
+        s["avg_wait"] = s["total_wait"] / s["sent"] if s["sent"] else 0.0
+        return s
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: int | None,
+    ) -> Any:
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            # Callback answers, getUpdates etc. are not chat-limited
+            return await callback(*args, **kwargs)
+
+        key = edit = None
+        if endpoint in COALESCED_ENDPOINTS and data.get("message_id"):
+            key = (chat_id, data["message_id"])
+            pending = self._edits.get(key)
+            if pending is not None and not pending.sending:
+                # An older edit is still waiting for its turn: send this
+                # text in its place rather than reserving another token
+                pending.callback = callback
+                pending.args, pending.kwargs = args, kwargs
+                self._stats.coalesced += 1
+                return await asyncio.shield(pending.future)
+            future = asyncio.get_running_loop().create_future()
+            future.add_done_callback(_consume)
+            edit = _PendingEdit(callback, args, kwargs, future)
+            self._edits[key] = edit
+            while len(self._edits) > MAX_TRACKED_EDITS:
+                self._edits.popitem(last=False)
+
+        retries = self.max_retries if rate_limit_args is None else rate_limit_args
+        enqueued = time.monotonic()
+        self._stats.depth += 1
+        self._stats.max_depth = max(self._stats.max_depth, self._stats.depth)
+        try:
+            for attempt in range(retries + 1):
+                await self._wait_turn(chat_id)
+                if edit is not None:
+                    edit.sending = True
+                    callback, args, kwargs = edit.callback, edit.args, edit.kwargs
+                try:
+                    result = await callback(*args, **kwargs)
+                except RetryAfter as e:
+                    seconds = _seconds(e.retry_after)
+                    self._chat_bucket(chat_id).block(seconds)
+                    if attempt == retries:
+                        raise
+                    if edit is not None:
+                        # Newer edits may replace the text again while paused
+                        edit.sending = False
+                    self._stats.retried += 1
+                    logger.warning(
+                        "Telegram flood limit for chat %s, retrying in %.0fs",
+                        chat_id,
+                        seconds,
+                    )
+                    continue
+                wait = time.monotonic() - enqueued
+                self._stats.sent += 1
+                self._stats.total_wait += wait
+                self._stats.max_wait = max(self._stats.max_wait, wait)
+                if edit is not None:
+                    _resolve(edit.future, result=result)
+                return result
+        except BaseException as e:
+            self._stats.failed += 1
+            if edit is not None:
+                _resolve(edit.future, error=e)
+            raise
+        finally:
+            self._stats.depth -= 1
+            if key is not None and self._edits.get(key) is edit:
+                del self._edits[key]
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            group = isinstance(chat_id, str) or chat_id < 0
+            bucket = (
+                TokenBucket(GROUP_RATE, GROUP_BURST)
+                if group
+                else TokenBucket(CHAT_RATE, CHAT_BURST)
+            )
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _wait_turn(self, chat_id: int | str) -> None:
+        wait = max(self._chat_bucket(chat_id).reserve(), self._global.reserve())
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def _resolve(
+    future: asyncio.Future, result: Any = None, error: BaseException | None = None
+) -> None:
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def _seconds(retry_after: Any) -> float:
+    """RetryAfter.retry_after is an int or a timedelta depending on version."""
+    if isinstance(retry_after, (int, float)):
+        return float(retry_after)
+    return retry_after.total_seconds()
+
+
+def _consume(future: asyncio.Future) -> None:
+    """Mark a coalesced edit's error as retrieved even if nobody waited."""
+    if not future.cancelled():
+        future.exception()
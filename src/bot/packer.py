@@ -0,0 +1,192 @@
+"""Pack MarkdownV2 text into as few Telegram messages as possible.
+
+Formatted blocks are streamed into messages filled up to the length
+limit. A block that does not fit in the space left is split, preferably
+at a line end, otherwise between two tokens of a line. A split never
+separates a backslash from the character it escapes. Entities still open
+at a split (bold, italic, code, a ``` block...) are closed at the end of
+one message and reopened at the start of the next. A split ``` block is
+reopened with its first line, which in our tables is the column header.
+
+Lengths are counted in UTF-16 code units of the marked-up text, which is
+never less than what Telegram counts after parsing the entities.
+Inline links are not tracked; the formatters do not produce them.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+# Telegram's limit on the length of one message
+MAX_MESSAGE_LENGTH = 4096
+
+PRE = "```"
+CODE = "`"
+# Longest first, so "__" (underline) wins over "_" (italic)
+INLINE_MARKERS = ("||", "__", "*", "_", "~", CODE)
+_SPECIAL = frozenset("\\*_~|`")
+
+
+@dataclass(frozen=True)
+class _Entity:
+    marker: str
+    opening: str
+    closing: str
+    header: str | None = None
+
+    @property
+    def reopening(self) -> str:
+        if self.header is None:
+            return self.opening
+        return f"{self.opening}{self.header}\n"
+
+
+Stack = tuple[_Entity, ...]
+
+
+def pack(
+    blocks: Iterable[str], limit: int = MAX_MESSAGE_LENGTH, sep: str = "\n"
+) -> Iterator[str]:
+    """Yield messages of at most `limit` units holding all blocks in order.
+
+    Blocks are joined with `sep` when they share a message.
+    """
+    parts: list[str] = []
+    used = 0
+    stack: Stack = ()
+    fresh = True  # nothing but reopened entities in the current message
+    # The last text added if it opened a ``` block: (index in parts, stack
+    # before it, text, stuck). A stuck fence starts the message or directly
+    # follows another fence, so moving it on would leave nothing behind.
+    fence: tuple[int, Stack, str, bool] | None = None
+
+    def add(joiner: str, text: str, after: Stack, whole: bool = True) -> None:
+        nonlocal used, stack, fresh, fence
+        top = after[-1] if after else None
+        if top is not None and top.marker == PRE and not (stack and top is stack[-1]):
+            fence = (len(parts), stack, text, fresh or fence is not None)
+        else:
+            if whole and fence is not None:
+                # The first full line of a ``` block is its header
+                after = _with_header(text, after)
+            fence = None
+        parts.append(joiner + text)
+        used += _units(joiner + text)
+        stack, fresh = after, False
+
+    def flush() -> str:
+        nonlocal parts, used, stack, fresh, fence
+        carry = fence if fence is not None and not fence[3] else None
+        if carry is not None:
+            # An opening ``` line with nothing after it yet moves to the next
+            # message rather than leave an empty code block in this one
+            after, stack = stack, carry[1]
+            del parts[carry[0] :]
+        text = "".join(parts) + _closing(stack)
+        opening = _reopening(stack, limit)
+        parts, used, fresh, fence = [opening], _units(opening), True, None
+        if carry is not None:
+            add("", carry[2], after)
+        return text
+
+    for block in blocks:
+        for i, line in enumerate(block.split("\n")):
+            line_joiner = sep if i == 0 else "\n"
+            after = _advance(line, stack)
+            if _fits(used, "" if fresh else line_joiner, line, after, limit):
+                add("" if fresh else line_joiner, line, after)
+                continue
+            # Flushing after a stuck fence would leave an empty message or
+            # code block, so split this line after it instead
+            if not fresh and not (fence is not None and fence[3]):
+                yield flush()
+                if _fits(used, "" if fresh else line_joiner, line, after, limit):
+                    add("" if fresh else line_joiner, line, after)
+                    continue
+            # The line alone is too long for a message: split between tokens
+            for j, (token, after) in enumerate(_tokenize(line, stack)):
+                joiner = line_joiner if j == 0 else ""
+                if not fresh and not _fits(used, joiner, token, after, limit):
+                    yield flush()
+                add("" if fresh else joiner, token, after, whole=False)
+
+    if not fresh:
+        yield "".join(parts) + _closing(stack)
+
+
+def _fits(used: int, joiner: str, text: str, after: Stack, limit: int) -> bool:
+    return used + _units(joiner + text) + _units(_closing(after)) <= limit
+
+
+def _units(text: str) -> int:
+    """Length in UTF-16 code units, as Telegram counts it."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _closing(stack: Stack) -> str:
+    return "".join(e.closing for e in reversed(stack))
+
+
+def _reopening(stack: Stack, limit: int) -> str:
+    """Markers reopening `stack`, without headers that would crowd out text."""
+    text = "".join(e.reopening for e in stack)
+    if _units(text + _closing(stack)) <= limit // 2:
+        return text
+    return "".join(e.opening for e in stack)
+
+
+def _advance(line: str, stack: Stack) -> Stack:
+    """Entities open after `line`, given those open before it."""
+    if not _SPECIAL.intersection(line):
+        return stack
+    tokens = _tokenize(line, stack)
+    return tokens[-1][1] if tokens else stack
+
+
+def _with_header(line: str, stack: Stack) -> Stack:
+    """Record `line` as the header of the ``` block open at the top."""
+    if stack and stack[-1].marker == PRE and stack[-1].header is None:
+        top = stack[-1]
+        return stack[:-1] + (_Entity(PRE, top.opening, top.closing, line),)
+    return stack
+
+
+def _tokenize(line: str, stack: Stack) -> list[tuple[str, Stack]]:
+    """Split a line into unsplittable tokens, each with the stack after it.
+
+    An opening marker is kept with the token after it, so a split never
+    leaves an empty entity such as "__" that would read as another marker.
+    """
+    tokens: list[tuple[str, Stack]] = []
+    i, n = 0, len(line)
+    glue = opened = False
+    while i < n:
+        top = stack[-1] if stack else None
+        if line[i] == "\\" and i + 1 < n:
+            token = line[i : i + 2]
+        elif top is not None and top.marker in (PRE, CODE):
+            # Inside code only the closing marker is special
+            if line.startswith(top.marker, i):
+                token = top.marker
+                stack = stack[:-1]
+            else:
+                token = line[i]
+        elif line.startswith(PRE, i):
+            # The rest of the line is the language of the block
+            token = line[i:]
+            stack = stack + (_Entity(PRE, token + "\n", "\n" + PRE),)
+        else:
+            token = next((m for m in INLINE_MARKERS if line.startswith(m, i)), "")
+            if not token:
+                token = line[i]
+            elif any(e.marker == token for e in stack):
+                stack = tuple(e for e in stack if e.marker != token)
+            else:
+                stack = stack + (_Entity(token, token, token),)
+                opened = True
+        i += len(token)
+        if glue:
+            token = tokens.pop()[0] + token
+        tokens.append((token, stack))
+        glue, opened = opened, False
+    return tokens
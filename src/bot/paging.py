@@ -0,0 +1,85 @@
+"""Entity lists one page at a time.
+
+A parent whose full child list is in the entity index is paged locally.
+Otherwise only the requested page is fetched from the Graph API, using
+the `after` cursors of the pages seen so far. Those are kept in the
+user's data, so going back needs no cursor of its own.
+
+Once the first page of an account's campaigns has been shown, the whole
+account tree is fetched in the background (see prefetch_tree), so later
+pages and the ad set and ad lists below are paged locally.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+from src.facebook import aio
+from src.facebook.entity_cache import entities
+
+logger = logging.getLogger("fb-ads-bot")
+
+# Entities shown per page of an entity list keyboard
+ENTITY_PAGE_SIZE = 20
+
+
+@dataclass
+class Page:
+    items: list[dict[str, Any]]
+    number: int
+    has_next: bool
+    total_pages: int | None = None
+
+
+# Accounts whose tree is being fetched; holds the tasks so they are not
+# garbage-collected while running
+_prefetching: dict[str, asyncio.Task] = {}
+
+
+async def entity_page(
+    user_data: dict[str, Any], entity_type: str, parent_id: str, number: int = 0
+) -> Page:
+    """Page `number` (0-based) of a parent's campaigns, ad sets or ads."""
+    known = entities.children(parent_id)
+    if known is not None:
+        total = max(1, -(-len(known) // ENTITY_PAGE_SIZE))
+        number = min(max(number, 0), total - 1)
+        start = number * ENTITY_PAGE_SIZE
+        end = start + ENTITY_PAGE_SIZE
+        return Page(known[start:end], number, end < len(known), total)
+
+    # cursors[n] is the `after` cursor that starts page n
+    cursors: list[str | None] = user_data.setdefault("page_cursors", {}).setdefault(
+        f"{entity_type}:{parent_id}", [None]
+    )
+    number = min(max(number, 0), len(cursors) - 1)
+    items, after = await aio.list_page(
+        entity_type, parent_id, cursors[number], ENTITY_PAGE_SIZE
+    )
+    del cursors[number + 1 :]
+    if after:
+        cursors.append(after)
+    return Page(items, number, after is not None)
+
+
+def prefetch_tree(account_id: str) -> None:
+    """Index an account's whole tree in the background, once at a time.
+
+    Does nothing if the account's campaigns are already indexed or a
+    prefetch for it is still running.
+    """
+    if account_id in _prefetching or entities.children(account_id) is not None:
+        return
+    task = asyncio.create_task(_prefetch(account_id))
+    _prefetching[account_id] = task
+    task.add_done_callback(lambda _: _prefetching.pop(account_id, None))
+
+
+async def _prefetch(account_id: str) -> None:
+    try:
+        await aio.get_account_tree(account_id)
+    except Exception as e:
+        # Paging keeps working from the Graph API page by page
+        logger.warning("Prefetching the tree of %s failed: %s", account_id, e)
@@ -0,0 +1,304 @@
+"""Precompiled report layouts with MarkdownV2, HTML, plain-text and CSV output.
+
+A layout is a list of line templates written once, independent of the
+output format:
+
+    "{name}"        a value from the data, rendered with str()
+    "{spend:$.2f}"  formatted with format(); a leading "$" in the spec
+                    prefixes a dollar sign, "num" formats ints with
+                    thousands separators and floats with two decimals
+    "*...*"         bold
+    "`...`"         code
+
+A line may also be a tuple of alternatives: the first one whose values
+are all present (not None or "") is rendered, and a trailing None drops
+the line when none of them applies.
+
+Every layout is compiled at import into one Python function per output,
+with static text already escaped and markup already translated, so a
+render is a single f-string over the dynamic values. Text values are
+escaped through a cache; formatted numbers only have the few characters
+a number can contain escaped.
+"""
+from __future__ import annotations
+
+import csv
+import functools
+import html
+import io
+import string
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, Mapping, Sequence, Union
+
+# MarkdownV2 characters that must be backslash-escaped outside code spans
+MD_SPECIAL = "_*[]()~`>#+-=|{}.!"
+_MD_ESCAPES = [(ch, "\\" + ch) for ch in MD_SPECIAL]
+# Joins values for one-pass escaping; never part of message text
+FIELD_SEP = "\x00"
+# Distinct text values (names, IDs, dates, statuses) whose escaped form is kept
+TEXT_CACHE_SIZE = 4096
+
+Line = Union[str, Sequence[Union[str, None]]]
+
+
+def escape_markdown(text: str) -> str:
+    """Backslash-escape MarkdownV2 special characters."""
+    # str.replace runs in C and is skipped for characters not present,
+    # which beats both a per-character loop and str.translate with a dict.
+    for ch, escaped in _MD_ESCAPES:
+        if ch in text:
+            text = text.replace(ch, escaped)
+    return text
+
+
+def escape_html(text: str) -> str:
+    return html.escape(text, quote=False)
+
+
+def escape_many(
+    texts: list[str], escape: Callable[[str], str] = escape_markdown
+) -> list[str]:
+    """Escape many values with one pass over their joined text."""
+    if len(texts) < 2:
+        return [escape(t) for t in texts]
+    out = escape(FIELD_SEP.join(texts)).split(FIELD_SEP)
+    if len(out) != len(texts):
+        # A value contained the separator itself
+        return [escape(t) for t in texts]
+    return out
+
+
+@dataclass(frozen=True)
+class Markup:
+    """How one output format escapes text and marks up bold and code.
+
+    `numbers` lists the characters a formatted number can contain (digits,
+    "$", ",", ".", "-", "+", "%", "e", "inf", "nan") that need escaping.
+    """
+
+    escape: Callable[[str], str]
+    bold: tuple[str, str]
+    code: tuple[str, str]
+    numbers: str = ""
+
+
+OUTPUTS = {
+    "markdown": Markup(escape_markdown, ("*", "*"), ("`", "`"), numbers=".-+"),
+    "html": Markup(escape_html, ("<b>", "</b>"), ("<code>", "</code>")),
+    "plain": Markup(str, ("", ""), ("", "")),
+}
+
+_MARKERS = {"*": "bold", "`": "code"}
+# Last character of a format spec that formats a number
+_NUMERIC_TYPES = frozenset("bcdeEfFgGnoxX%,_")
+# Number types that never write an exponent, so no "+" unless asked for
+_NO_EXPONENT_TYPES = frozenset("bcdfFoxX%")
+
+
+class Layout:
+    """A report layout compiled for every output in OUTPUTS."""
+
+    def __init__(self, *lines: Line) -> None:
+        self.lines = [
+            tuple(line) if isinstance(line, (tuple, list)) else (line,)
+            for line in lines
+        ]
+        if self.lines and None in self.lines[0]:
+            raise ValueError("The first line of a layout cannot be optional")
+        self.fields = tuple(
+            dict.fromkeys(
+                name
+                for alternatives in self.lines
+                for source in alternatives
+                if source is not None
+                for name, _ in _parse(source)[1]
+            )
+        )
+        self._renderers = {
+            output: _build(self.lines, markup) for output, markup in OUTPUTS.items()
+        }
+
+    def render(self, values: Mapping[str, Any], output: str = "markdown") -> str:
+        """Lines with a single alternative require every value they use."""
+        return self._renderers[output](values)
+
+    def csv(self, rows: Iterable[Mapping[str, Any]]) -> str:
+        """One CSV row of raw values per mapping, with a header row."""
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(self.fields)
+        for row in rows:
+            writer.writerow(
+                "" if row.get(name) is None else row[name] for name in self.fields
+            )
+        return out.getvalue()
+
+
+# --- Compilation ---
+
+
+@functools.lru_cache(maxsize=None)
+def _text_escaper(escape: Callable[[str], str]) -> Callable[[str], str]:
+    """A cached escape for text values, shared by all layouts."""
+    return functools.lru_cache(maxsize=TEXT_CACHE_SIZE)(escape)
+
+
+def _build(
+    lines: list[tuple[str | None, ...]], markup: Markup
+) -> Callable[[Mapping[str, Any]], str]:
+    """Generate and compile the render function of a layout for one output.
+
+    The function assigns each escaped value to a local (e0, e1, ...), picks
+    one alternative per optional line with an if/elif chain (s0, s1, ...)
+    and returns one f-string over the escaped static text and those locals.
+    """
+    body: list[str] = []
+    pieces: list[str] = []
+    counter = iter(range(1 << 30))
+
+    for i, alternatives in enumerate(lines):
+        newline = _literal("\n" if i else "")
+        if len(alternatives) == 1:
+            source = alternatives[0]
+            assert source is not None
+            text = _line(source, markup, body, [], counter, required=True)
+            pieces.append(newline + text)
+            continue
+
+        slot = f"s{next(counter)}"
+        branches: list[tuple[list[str], list[str], str]] = []
+        for source in alternatives:
+            if source is None:
+                break
+            statements: list[str] = []
+            conditions: list[str] = []
+            text = _line(source, markup, statements, conditions, counter)
+            branches.append((conditions, statements, f'{slot} = f"{newline}{text}"'))
+            if not conditions:
+                break
+        if not branches or branches[-1][0]:
+            # No alternative applies: the line is dropped
+            branches.append(([], [], f'{slot} = ""'))
+        for k, (conditions, statements, assign) in enumerate(branches):
+            if conditions:
+                head = f"{'elif' if k else 'if'} {' and '.join(conditions)}:"
+            else:
+                head = "else:" if k else "if True:"
+            body.append(f"    {head}")
+            body += [f"    {statement}" for statement in statements]
+            body.append(f"        {assign}")
+        pieces.append(f"{{{slot}}}")
+
+    code = "\n".join(
+        ["def render(v):", *body, f'    return f"{"".join(pieces)}"']
+    )
+    namespace: dict[str, Any] = {"_text": _text_escaper(markup.escape)}
+    exec(code, namespace)
+    return namespace["render"]
+
+
+def _line(
+    source: str,
+    markup: Markup,
+    body: list[str],
+    conditions: list[str],
+    counter: Iterator[int],
+    required: bool = False,
+) -> str:
+    """Compile one line template; returns the body of its f-string.
+
+    Statements computing the escaped values go to `body`. For an
+    alternative, the presence tests of its values go to `conditions`;
+    a required line reads its values with v[...] instead.
+    """
+    literals, fields = _parse(source)
+    open_spans: set[str] = set()
+    out = []
+    for i, literal in enumerate(literals):
+        chunk = []
+        for ch in literal:
+            kind = _MARKERS.get(ch)
+            if kind is None:
+                chunk.append(ch)
+                continue
+            out.append(_literal(markup.escape("".join(chunk))))
+            chunk = []
+            opening, closing = getattr(markup, kind)
+            if kind in open_spans:
+                open_spans.remove(kind)
+                out.append(_literal(closing))
+            else:
+                open_spans.add(kind)
+                out.append(_literal(opening))
+        out.append(_literal(markup.escape("".join(chunk))))
+        if i < len(fields):
+            name, spec = fields[i]
+            n = next(counter)
+            if required:
+                value = f"v[{name!r}]"
+            else:
+                value = f"x{n}"
+                # A number is never "", so only text values are tested for it
+                test = "not in (None, '')" if _is_text(spec) else "is not None"
+                conditions.append(f"({value} := v.get({name!r})) {test}")
+            body.append(f"    e{n} = {_value(value, spec, markup)}")
+            out.append(f"{{e{n}}}")
+    if open_spans:
+        raise ValueError(f"Unclosed markup in template: {source!r}")
+    return "".join(out)
+
+
+def _value(value: str, spec: str, markup: Markup) -> str:
+    """Expression formatting and escaping one value for `markup`."""
+    if spec == "num":
+        text = (
+            f'(f"{{{value}:,.2f}}" if isinstance({value}, float) '
+            f'else f"{{{value}:,}}")'
+        )
+        kind = "f"
+    elif spec.startswith("$"):
+        text = f'f"${{{value}:{spec[1:]}}}"'
+        kind = spec[-1]
+    elif spec:
+        text = f'f"{{{value}:{spec}}}"'
+        kind = spec[-1]
+    else:
+        text = f"str({value})"
+    if _is_text(spec):
+        return text if markup.escape is str else f"_text({text})"
+    for ch in markup.numbers:
+        if ch == "+" and "+" not in spec and kind in _NO_EXPONENT_TYPES:
+            continue
+        text += f".replace({ch!r}, {markup.escape(ch)!r})"
+    return text
+
+
+def _is_text(spec: str) -> bool:
+    """Whether a field spec renders text rather than a number."""
+    return spec != "num" and (not spec or spec[-1] not in _NUMERIC_TYPES)
+
+
+def _literal(text: str) -> str:
+    """`text` as the literal part of a double-quoted f-string."""
+    return (
+        text.replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+        .replace("{", "{{")
+        .replace("}", "}}")
+    )
+
+
+def _parse(source: str) -> tuple[list[str], list[tuple[str, str]]]:
+    """Split a line into literal chunks and (field, spec) pairs.
+
+    literals[i] precedes fields[i]; there is one more literal than fields.
+    """
+    literals, fields = [], []
+    for literal, name, spec, _ in string.Formatter().parse(source):
+        literals.append(literal)
+        if name is not None:
+            fields.append((name, spec or ""))
+    if len(literals) == len(fields):
+        literals.append("")
+    return literals, fields
@@ -0,0 +1,80 @@
+"""Single-pass parsing of insight action arrays into dense matrices.
+
+Each insight row carries `actions` and `cost_per_action_type` lists of
+{action_type, value} items. Instead of scanning them once per metric we
+walk every row once and place all action types into one action-type x
+row matrix, so any conversion metric is a single row lookup afterwards.
+"""
+from __future__ import annotations
+
+from typing import Any, Sequence
+
+import numpy as np
+
+
+class ActionMatrix:
+    """values[i, j] is the value of action type types[i] in row j."""
+
+    def __init__(
+        self, types: list[str], values: np.ndarray, missing: float = 0.0
+    ) -> None:
+        self.types = types
+        self.values = values
+        self.missing = missing
+        self._index = {t: i for i, t in enumerate(types)}
+
+    @property
+    def n_rows(self) -> int:
+        return self.values.shape[1]
+
+    def get(self, action_type: str) -> np.ndarray:
+        """One value per row; `missing` where the row lacks the action."""
+        i = self._index.get(action_type)
+        if i is None:
+            return np.full(self.n_rows, self.missing)
+        return self.values[i]
+
+    def take(self, index: np.ndarray) -> ActionMatrix:
+        return ActionMatrix(self.types, self.values[:, index], self.missing)
+
+    @classmethod
+    def concat(cls, matrices: Sequence[ActionMatrix]) -> ActionMatrix:
+        """Stack the rows of several matrices over all their action types."""
+        index: dict[str, int] = {}
+        for matrix in matrices:
+            for action_type in matrix.types:
+                index.setdefault(action_type, len(index))
+        missing = matrices[0].missing if matrices else 0.0
+        values = np.full((len(index), sum(m.n_rows for m in matrices)), missing)
+        start = 0
+        for matrix in matrices:
+            rows = slice(start, start + matrix.n_rows)
+            values[[index[t] for t in matrix.types], rows] = matrix.values
+            start += matrix.n_rows
+        return cls(list(index), values, missing)
+
+    def rollup(self, group: np.ndarray, n_groups: int) -> ActionMatrix:
+        """Sum rows that share a group number (counts only, not costs)."""
+        out = np.zeros((len(self.types), n_groups))
+        np.add.at(out, (slice(None), group), self.values)
+        return ActionMatrix(self.types, out, self.missing)
+
+
+def parse_actions(
+    rows: Sequence[dict[str, Any]], key: str = "actions", missing: float = 0.0
+) -> ActionMatrix:
+    """Build the matrix for the `key` action list of every row at once."""
+    index: dict[str, int] = {}
+    type_of = index.setdefault
+    items = [item for row in rows for item in row.get(key) or ()]
+    type_idx = [type_of(item["action_type"], len(index)) for item in items]
+    row_idx = np.repeat(
+        np.arange(len(rows)), [len(row.get(key) or ()) for row in rows]
+    )
+
+    values = np.full((len(index), len(rows)), missing)
+    if items:
+        values[type_idx, row_idx] = np.fromiter(
+            (float(item["value"]) for item in items), np.float64, len(items)
+        )
+    return ActionMatrix(list(index), values, missing)
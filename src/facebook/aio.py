@@ -0,0 +1,317 @@
+"""Async facade over the Facebook API backends.
+
+By default every call runs the blocking SDK in a shared worker pool so
+handlers never block the event loop. The pool size caps concurrent Graph
+API calls, each call gets a timeout, and per-function stats split time
+spent queued from time spent executing. With use_async_backend() the same
+functions run on the native asyncio client in async_graph instead.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, Iterator
+
+from src.facebook import async_graph, insights, management, reports
+from src.facebook.insight_table import InsightTable
+from src.utils.errors import ApiTimeoutError
+
+logger = logging.getLogger("fb-ads-bot")
+
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT = 60.0
+# Breakdown tables can run as report jobs, which take minutes, not seconds
+REPORT_TIMEOUT = 5 * 60.0
+STREAM_CHUNK = 100
+
+_executor: ThreadPoolExecutor | None = None
+_timeout = DEFAULT_TIMEOUT
+_async_backend = False
+
+
+@dataclass
+class CallStats:
+    calls: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    queued_seconds: float = 0.0
+    exec_seconds: float = 0.0
+
+
+_stats: dict[str, CallStats] = {}
+_stats_lock = threading.Lock()
+
+
+def init_executor(
+    max_workers: int = DEFAULT_WORKERS, timeout: float = DEFAULT_TIMEOUT
+) -> ThreadPoolExecutor:
+    """Create the shared worker pool that bounds concurrent Graph API calls."""
+    global _executor, _timeout
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _executor = ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="fb-api"
+    )
+    _timeout = timeout
+    logger.info(
+        "Facebook API worker pool started (%d workers, %.0fs timeout)",
+        max_workers,
+        timeout,
+    )
+    return _executor
+
+
+def use_async_backend(client: async_graph.AsyncGraphClient) -> None:
+    """Serve facade calls from the native asyncio Graph client."""
+    global _async_backend
+    async_graph.init_async_client(client)
+    _async_backend = True
+    logger.info("Using async Graph API backend")
+
+
+def get_executor() -> ThreadPoolExecutor:
+    if _executor is None:
+        return init_executor()
+    return _executor
+
+
+def get_stats() -> dict[str, dict[str, Any]]:
+    """Return a snapshot of per-function call stats."""
+    with _stats_lock:
+        return {name: asdict(s) for name, s in _stats.items()}
+
+
+def _record(name: str, **deltas: float) -> None:
+    with _stats_lock:
+        s = _stats.setdefault(name, CallStats())
+        for key, val in deltas.items():
+            setattr(s, key, getattr(s, key) + val)
+
+
+async def run(
+    func: Callable[..., Any], *args, timeout: float | None = None, **kwargs
+) -> Any:
+    """Run a blocking call in the worker pool and await its result.
+
+    Raises ApiTimeoutError if the call has not finished `timeout` seconds
+    (default: the pool's configured timeout) after a worker started it.
+    Time spent waiting for a free worker does not count, so a large
+    fan-out queued behind a small pool does not time out unsent. A call
+    still queued when the caller is cancelled is dropped; one already
+    running is left to finish, but report jobs it polls stop at the
+    timeout or cancellation (see reports.caller_limits).
+    """
+    name = getattr(func, "__qualname__", repr(func))
+    loop = asyncio.get_running_loop()
+    began = loop.create_future()
+    cancelled = threading.Event()
+    limit = _timeout if timeout is None else timeout
+    submitted = time.monotonic()
+
+    def job():
+        started = time.monotonic()
+        loop.call_soon_threadsafe(began.set_result, None)
+        try:
+            with reports.caller_limits(started + limit, cancelled):
+                return func(*args, **kwargs)
+        except Exception:
+            _record(name, errors=1)
+            raise
+        finally:
+            _record(
+                name,
+                calls=1,
+                queued_seconds=started - submitted,
+                exec_seconds=time.monotonic() - started,
+            )
+
+    future = loop.run_in_executor(get_executor(), job)
+    try:
+        await asyncio.wait({future, began}, return_when=asyncio.FIRST_COMPLETED)
+        return await asyncio.wait_for(future, limit)
+    except asyncio.CancelledError:
+        future.cancel()
+        cancelled.set()
+        raise
+    except asyncio.TimeoutError:
+        cancelled.set()
+        _record(name, timeouts=1)
+        logger.warning("%s timed out after %gs", name, limit)
+        raise ApiTimeoutError(f"{name} timed out after {limit:g}s") from None
+
+
+async def run_async(
+    func: Callable[..., Any], *args, timeout: float | None = None
+) -> Any:
+    """Await a coroutine function with the facade's timeout and stats."""
+    name = getattr(func, "__qualname__", repr(func))
+    limit = _timeout if timeout is None else timeout
+    started = time.monotonic()
+    try:
+        return await asyncio.wait_for(func(*args), limit)
+    except asyncio.TimeoutError:
+        _record(name, timeouts=1)
+        logger.warning("%s timed out after %gs", name, limit)
+        raise ApiTimeoutError(f"{name} timed out after {limit:g}s") from None
+    except Exception:
+        _record(name, errors=1)
+        raise
+    finally:
+        _record(name, calls=1, exec_seconds=time.monotonic() - started)
+
+
+async def _call(
+    sync_func: Callable[..., Any], *args, timeout: float | None = None
+) -> Any:
+    """Dispatch to the same-named function of the active backend."""
+    if _async_backend:
+        return await run_async(
+            getattr(async_graph, sync_func.__name__), *args, timeout=timeout
+        )
+    return await run(sync_func, *args, timeout=timeout)
+
+
+class _Pull:
+    """A blocking generator advanced in the worker pool, one pull at a time.
+
+    A pull that timed out keeps running in its worker, so the next pull and
+    the final close wait for it instead of touching the generator while it
+    is still executing.
+    """
+
+    def __init__(self, items: Iterator[Any]) -> None:
+        self._items = items
+        self._lock = threading.Lock()
+
+    def take(self, n: int) -> list[Any]:
+        with self._lock:
+            return list(islice(self._items, n))
+
+    def close(self) -> None:
+        with self._lock:
+            self._items.close()
+
+
+async def _stream(
+    sync_gen: Callable[..., Iterator[Any]], *args, chunk: int = STREAM_CHUNK
+) -> AsyncIterator[Any]:
+    """Yield items of a paginated backend generator as pages arrive.
+
+    On the SDK backend the generator is advanced `chunk` items at a time in
+    the worker pool, so each pull is one timed, bounded call and the event
+    loop can process earlier items while later pages are still unfetched.
+    """
+    if _async_backend:
+        async for item in getattr(async_graph, sync_gen.__name__)(*args):
+            yield item
+        return
+    pull = _Pull(sync_gen(*args))
+    try:
+        while True:
+            batch = await run(pull.take, chunk)
+            for item in batch:
+                yield item
+            if len(batch) < chunk:
+                return
+    finally:
+        # Closing may wait for a timed-out pull and runs the generator's
+        # cleanup, so it happens in a worker, not on the event loop
+        get_executor().submit(pull.close)
+
+
+# --- Insights ---
+
+
+async def get_daily_insights(account_id: str) -> dict[str, Any] | None:
+    return await _call(insights.get_daily_insights, account_id)
+
+
+async def get_comparison_insights(
+    account_id: str, days: int = 7
+) -> dict[str, dict[str, Any] | None]:
+    return await _call(insights.get_comparison_insights, account_id, days)
+
+
+async def get_daily_series(
+    account_id: str, since: str, until: str
+) -> list[dict[str, Any]]:
+    return await _call(insights.get_daily_series, account_id, since, until)
+
+
+async def get_breakdown_table(
+    account_id: str,
+    level: str = "campaign",
+    breakdown: str | None = None,
+    days: int = 7,
+) -> InsightTable:
+    return await _call(
+        insights.get_breakdown_table,
+        account_id,
+        level,
+        breakdown,
+        days,
+        timeout=REPORT_TIMEOUT,
+    )
+
+
+def stream_insights(
+    account_id: str, params: dict[str, Any]
+) -> AsyncIterator[dict[str, Any]]:
+    return _stream(insights.iter_insights, account_id, params)
+
+
+# --- Management ---
+
+
+async def list_campaigns(account_id: str) -> list[dict[str, Any]]:
+    return await _call(management.list_campaigns, account_id)
+
+
+async def get_account_tree(account_id: str) -> list[dict[str, Any]]:
+    return await _call(management.get_account_tree, account_id)
+
+
+async def list_adsets(campaign_id: str) -> list[dict[str, Any]]:
+    return await _call(management.list_adsets, campaign_id)
+
+
+async def list_ads(adset_id: str) -> list[dict[str, Any]]:
+    return await _call(management.list_ads, adset_id)
+
+
+async def list_page(
+    entity_type: str,
+    parent_id: str,
+    after: str | None = None,
+    limit: int = management.PAGE_LIMIT,
+) -> tuple[list[dict[str, Any]], str | None]:
+    return await _call(management.list_page, entity_type, parent_id, after, limit)
+
+
+async def update_status(entity_type: str, entity_id: str, new_status: str) -> None:
+    await _call(management.update_status, entity_type, entity_id, new_status)
+
+
+async def update_budget(
+    entity_type: str, entity_id: str, daily_budget_dollars: float
+) -> None:
+    await _call(
+        management.update_budget, entity_type, entity_id, daily_budget_dollars
+    )
+
+
+def stream_campaigns(account_id: str) -> AsyncIterator[dict[str, Any]]:
+    return _stream(management.iter_campaigns, account_id)
+
+
+def stream_adsets(campaign_id: str) -> AsyncIterator[dict[str, Any]]:
+    return _stream(management.iter_adsets, campaign_id)
+
+
+def stream_ads(adset_id: str) -> AsyncIterator[dict[str, Any]]:
+    return _stream(management.iter_ads, adset_id)
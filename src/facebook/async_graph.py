@@ -0,0 +1,486 @@
+"""Native asyncio backend for the Graph API.
+
+Mirrors the function signatures of insights.py and management.py as
+coroutines, issuing requests with httpx on the event loop instead of
+through the SDK in a thread pool. Parsing, caching, throttling, retries,
+the circuit breaker and error classification are shared with the SDK
+backend, so both return identical shapes and raise the same exceptions.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import time
+from typing import Any, AsyncIterator
+
+import httpx
+from facebook_business.api import FacebookAdsApi
+
+from src.facebook import insights, management, planner, reports
+from src.facebook.client import (
+    DEFAULT_RETRY,
+    breaker,
+    classify_error_payload,
+    count_error,
+    next_cursor,
+)
+from src.facebook.entity_cache import entities
+from src.facebook.insight_table import InsightTable
+from src.facebook.throttle import account_from_path, throttle
+from src.utils.errors import ApiTimeoutError, FacebookBotError, TransientError
+
+logger = logging.getLogger("fb-ads-bot")
+
+GRAPH_URL = "https://graph.facebook.com"
+
+
+class AsyncGraphClient:
+    def __init__(
+        self,
+        access_token: str,
+        app_secret: str = "",
+        api_version: str = FacebookAdsApi.API_VERSION,
+        max_connections: int = 100,
+        timeout: float = 30.0,
+    ) -> None:
+        self._params = {"access_token": access_token}
+        if app_secret:
+            self._params["appsecret_proof"] = hmac.new(
+                app_secret.encode(), access_token.encode(), hashlib.sha256
+            ).hexdigest()
+        self._base = f"{GRAPH_URL}/{api_version}/"
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def request(
+        self, method: str, path: str, params: dict[str, Any] | None = None
+    ) -> dict[str, Any]:
+        """Make one Graph call with retries, throttling and the breaker.
+
+        `path` is relative to the versioned Graph URL, or a full paging URL.
+        """
+        account_id = account_from_path(path)
+        probe = bool(account_id) and breaker.before_call(account_id)
+        try:
+            return await self._request_with_retries(
+                method, path, params, account_id
+            )
+        finally:
+            # An error record_failure never saw must not leave the probe taken
+            if probe:
+                breaker.end_probe(account_id)
+
+    async def _request_with_retries(
+        self,
+        method: str,
+        path: str,
+        params: dict[str, Any] | None,
+        account_id: str | None,
+    ) -> dict[str, Any]:
+        policy = DEFAULT_RETRY
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                body = await self._send(method, path, params, account_id)
+            except FacebookBotError as e:
+                error = e
+            else:
+                if account_id:
+                    breaker.record_success(account_id)
+                return body
+
+            count_error(type(error).__name__)
+            attempt += 1
+            retryable = isinstance(error, policy.retry_on)
+            delay = getattr(error, "retry_after", None) or policy.backoff(attempt)
+            if (
+                not retryable
+                or attempt >= policy.max_attempts
+                or time.monotonic() - started + delay > policy.deadline
+            ):
+                if account_id:
+                    breaker.record_failure(account_id, error)
+                raise error
+
+            count_error("retries")
+            logger.warning(
+                "%s %s failed (%s), retry %d/%d in %.1fs",
+                method,
+                path,
+                error,
+                attempt,
+                policy.max_attempts - 1,
+                delay,
+            )
+            await asyncio.sleep(delay)
+
+    async def paginate(
+        self, path: str, params: dict[str, Any] | None = None
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Yield items from a Graph edge, following paging.next links."""
+        async for page in self.pages(path, params):
+            for item in page:
+                yield item
+
+    async def pages(
+        self, path: str, params: dict[str, Any] | None = None
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Yield the raw data list of each page of a Graph edge."""
+        target: str | None = path
+        while target:
+            body = await self.request("GET", target, params)
+            yield body.get("data", [])
+            target = body.get("paging", {}).get("next")
+            params = None
+
+    async def page(
+        self, path: str, params: dict[str, Any] | None = None
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        """Fetch a single page of a Graph edge and the cursor of the next one."""
+        body = await self.request("GET", path, params)
+        return body.get("data", []), next_cursor(body)
+
+    async def _send(
+        self,
+        method: str,
+        path: str,
+        params: dict[str, Any] | None,
+        account_id: str | None,
+    ) -> dict[str, Any]:
+        delay = throttle.delay_for(account_id)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if path.startswith("https://"):
+            # paging.next URLs already carry the token and every parameter;
+            # httpx would replace their query string with `params`
+            url, query = path, None
+        else:
+            url = self._base + path
+            query = dict(self._params)
+            for key, val in (params or {}).items():
+                query[key] = val if isinstance(val, str) else json.dumps(val)
+
+        try:
+            if method == "GET":
+                response = await self._client.get(url, params=query)
+            else:
+                response = await self._client.request(method, url, data=query)
+        except httpx.TransportError as e:
+            raise TransientError(f"Network error: {e}") from e
+
+        throttle.record(account_id, response.headers)
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+
+        if response.is_error or "error" in body:
+            err = body.get("error", {})
+            raise classify_error_payload(
+                code=err.get("code"),
+                subcode=err.get("error_subcode") or 0,
+                msg=err.get("message") or response.text[:200],
+                transient=bool(err.get("is_transient")),
+                http_status=response.status_code,
+                headers=response.headers,
+            )
+        return body
+
+
+_client: AsyncGraphClient | None = None
+
+
+def init_async_client(client: AsyncGraphClient) -> None:
+    global _client
+    _client = client
+
+
+def get_client() -> AsyncGraphClient:
+    if _client is None:
+        raise FacebookBotError("Async Graph client is not initialized")
+    return _client
+
+
+# --- Insights ---
+
+
+async def resolve_timezones(account_ids: list[str]) -> None:
+    """Async counterpart of planner.resolve_timezones."""
+    missing = planner.unresolved(account_ids)
+    if not missing:
+        return
+    try:
+        body = await get_client().request(
+            "GET", "", planner.timezone_query(missing)
+        )
+    except FacebookBotError as e:
+        logger.warning("Timezone lookup failed for %s: %s", missing, e)
+        planner.mark_failed(missing)
+        return
+    planner.set_account_timezones(planner.timezone_names(body))
+    planner.mark_failed(missing)
+
+
+async def get_daily_insights(account_id: str) -> dict[str, Any] | None:
+    """Fetch yesterday's aggregated insights for an ad account."""
+    await resolve_timezones([account_id])
+    yesterday = planner.yesterday(account_id).isoformat()
+    params = {
+        "time_range": {"since": yesterday, "until": yesterday},
+        "level": "account",
+    }
+    data = await _fetch_rows(account_id, params)
+    return insights._parse_rows(data[:1])[0] if data else None
+
+
+async def get_comparison_insights(
+    account_id: str, days: int = 7
+) -> dict[str, dict[str, Any] | None]:
+    """Fetch current vs previous period insights in one time_ranges call."""
+    await resolve_timezones([account_id])
+    periods = planner.comparison_periods(account_id, days)
+    rows = await _fetch_rows(account_id, insights._comparison_params(periods))
+    return insights._split_periods(rows, periods)
+
+
+async def get_daily_series(
+    account_id: str, since: str, until: str
+) -> list[dict[str, Any]]:
+    rows = await _fetch_rows(account_id, insights._series_params(since, until))
+    return insights._parse_rows(rows)
+
+
+async def get_breakdown_table(
+    account_id: str,
+    level: str = "campaign",
+    breakdown: str | None = None,
+    days: int = 7,
+) -> InsightTable:
+    await resolve_timezones([account_id])
+    params, fields, dims = insights._breakdown_query(
+        account_id, level, breakdown, days
+    )
+    key = insights._table_key(account_id, params, fields)
+    table = insights._cache.get(key)
+    if table is None:
+        tables = [
+            insights._to_table(page, dims)
+            async for page in _iter_raw_pages(account_id, params, fields)
+        ]
+        table = insights._concat_pages(tables, dims)
+        insights._cache.set(
+            key, table, insights._ttl_for(account_id, params)
+        )
+    return table
+
+
+async def _fetch_rows(
+    account_id: str,
+    params: dict[str, Any],
+    fields: list[str] = insights.INSIGHT_FIELDS,
+) -> list[dict[str, Any]]:
+    key = insights._cache_key(account_id, params, fields)
+    rows = insights._cache.get(key)
+    if rows is not None:
+        return rows
+
+    rows = [
+        row
+        async for page in _iter_raw_pages(account_id, params, fields)
+        for row in page
+    ]
+    insights._cache.set(key, rows, insights._ttl_for(account_id, params))
+    return rows
+
+
+async def iter_insights(
+    account_id: str,
+    params: dict[str, Any],
+    fields: list[str] = insights.INSIGHT_FIELDS,
+) -> AsyncIterator[dict[str, Any]]:
+    """Async counterpart of insights.iter_insights."""
+    async for page in _iter_raw_pages(account_id, params, fields):
+        for row in insights._parse_rows(page):
+            yield row
+
+
+def _iter_raw_pages(
+    account_id: str,
+    params: dict[str, Any],
+    fields: list[str] = insights.INSIGHT_FIELDS,
+) -> AsyncIterator[list[dict[str, Any]]]:
+    query = dict(params, fields=",".join(fields))
+    if reports.should_use_report(params):
+        return _iter_report_pages(account_id, query)
+    return get_client().pages(f"{account_id}/insights", query)
+
+
+async def _iter_report_pages(
+    account_id: str, query: dict[str, Any]
+) -> AsyncIterator[list[dict[str, Any]]]:
+    """Async counterpart of reports.iter_report_pages; polls without blocking."""
+    client = get_client()
+    for attempt in range(reports.REPORT_RETRIES + 1):
+        body = await client.request(
+            "POST", f"{account_id}/insights", reports.job_params(query)
+        )
+        report_run_id = body.get("report_run_id")
+        if not report_run_id:
+            raise FacebookBotError(f"No report job created for {account_id}")
+        logger.info("Submitted report job %s for %s", report_run_id, account_id)
+        try:
+            await _wait_for_report(str(report_run_id))
+        except TransientError as e:
+            if attempt == reports.REPORT_RETRIES:
+                raise
+            logger.warning("%s; resubmitting", e)
+            continue
+        pages = client.pages(
+            f"{report_run_id}/insights", {"limit": reports.RESULT_PAGE_LIMIT}
+        )
+        async for page in pages:
+            yield page
+        return
+
+
+async def _wait_for_report(report_run_id: str) -> None:
+    client = get_client()
+    started = time.monotonic()
+    for delay in reports.poll_delays():
+        body = await client.request(
+            "GET", report_run_id, {"fields": reports.STATUS_FIELDS}
+        )
+        if reports.check_status(report_run_id, body):
+            logger.info(
+                "Report job %s completed in %.0fs",
+                report_run_id,
+                time.monotonic() - started,
+            )
+            return
+        if time.monotonic() - started + delay > reports.REPORT_DEADLINE:
+            raise ApiTimeoutError(
+                f"Report job {report_run_id} still running after "
+                f"{reports.REPORT_DEADLINE}s "
+                f"({body.get('async_percent_completion', 0)}%)"
+            )
+        await asyncio.sleep(delay)
+
+
+# --- Management ---
+
+
+async def iter_campaigns(account_id: str) -> AsyncIterator[dict[str, Any]]:
+    params = {
+        "fields": ",".join(management.CAMPAIGN_FIELDS),
+        "limit": management.PAGE_LIMIT,
+    }
+    async for c in get_client().paginate(f"{account_id}/campaigns", params):
+        yield management._campaign_dict(c)
+
+
+async def iter_adsets(campaign_id: str) -> AsyncIterator[dict[str, Any]]:
+    params = {
+        "fields": ",".join(management.ADSET_FIELDS),
+        "limit": management.PAGE_LIMIT,
+    }
+    async for s in get_client().paginate(f"{campaign_id}/adsets", params):
+        yield management._adset_dict(s)
+
+
+async def iter_ads(adset_id: str) -> AsyncIterator[dict[str, Any]]:
+    params = {
+        "fields": ",".join(management.AD_FIELDS),
+        "limit": management.PAGE_LIMIT,
+    }
+    async for a in get_client().paginate(f"{adset_id}/ads", params):
+        yield management._ad_dict(a)
+
+
+async def list_campaigns(account_id: str) -> list[dict[str, Any]]:
+    campaigns = [c async for c in iter_campaigns(account_id)]
+    entities.put_children(account_id, "campaign", campaigns)
+    return campaigns
+
+
+async def list_adsets(campaign_id: str) -> list[dict[str, Any]]:
+    adsets = [s async for s in iter_adsets(campaign_id)]
+    entities.put_children(campaign_id, "adset", adsets)
+    return adsets
+
+
+async def list_ads(adset_id: str) -> list[dict[str, Any]]:
+    ads = [a async for a in iter_ads(adset_id)]
+    entities.put_children(adset_id, "ad", ads)
+    return ads
+
+
+async def list_page(
+    entity_type: str,
+    parent_id: str,
+    after: str | None = None,
+    limit: int = management.PAGE_LIMIT,
+) -> tuple[list[dict[str, Any]], str | None]:
+    """Async counterpart of management.list_page."""
+    raw, cursor = await get_client().page(
+        f"{parent_id}/{management.EDGES[entity_type]}",
+        management.page_params(entity_type, after, limit),
+    )
+    items = management.parse_entities(entity_type, raw)
+    entities.put(parent_id, entity_type, items)
+    return items, cursor
+
+
+async def get_account_tree(account_id: str) -> list[dict[str, Any]]:
+    """Async counterpart of management.get_account_tree."""
+    raw = [
+        c
+        async for c in get_client().paginate(
+            f"{account_id}/campaigns", management.tree_params()
+        )
+    ]
+    campaigns, more_adsets, more_ads = management.index_tree(account_id, raw)
+    await asyncio.gather(
+        *(list_adsets(cid) for cid in more_adsets),
+        *(list_ads(aid) for aid in more_ads),
+    )
+    return campaigns
+
+
+async def update_status(entity_type: str, entity_id: str, new_status: str) -> None:
+    """Set status to ACTIVE or PAUSED."""
+    if entity_type not in management._OBJ_MAP:
+        raise KeyError(entity_type)
+    await get_client().request("POST", entity_id, {"status": new_status})
+    entities.invalidate(entity_id)
+    logger.info("Updated %s %s status to %s", entity_type, entity_id, new_status)
+
+
+async def update_budget(
+    entity_type: str, entity_id: str, daily_budget_dollars: float
+) -> None:
+    """Update daily budget. Accepts dollars, converts to cents for the API."""
+    if entity_type not in ("campaign", "adset"):
+        raise ValueError("Budget can only be set on campaigns or adsets")
+
+    budget_cents = str(int(round(daily_budget_dollars * 100)))
+    await get_client().request("POST", entity_id, {"daily_budget": budget_cents})
+    entities.invalidate(entity_id)
+    logger.info(
+        "Updated %s %s daily budget to $%.2f",
+        entity_type,
+        entity_id,
+        daily_budget_dollars,
+    )
@@ -0,0 +1,87 @@
+"""Thread-safe LRU cache with per-entry TTLs and a memory bound."""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Hashable
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+
+class TTLCache:
+    """LRU cache bounded by entry count and approximate size in bytes.
+
+    Each entry carries its own TTL in seconds; None means it never expires
+    and only leaves the cache through LRU eviction.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: OrderedDict[Hashable, tuple[Any, float | None, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires, _ = entry
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self._stats.hits += 1
+                    return value
+                self._remove(key)
+            self._stats.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: Any, ttl: float | None) -> None:
+        # Columnar values (NumPy arrays, InsightTable) report their own size
+        size = getattr(value, "nbytes", None)
+        if size is None:
+            size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        expires = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires, size)
+            self._stats.bytes += size
+            while (
+                len(self._data) > self.max_entries
+                or self._stats.bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._data)))
+                self._stats.evictions += 1
+            self._stats.entries = len(self._data)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._stats.entries = 0
+            self._stats.bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return asdict(self._stats)
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, size = self._data.pop(key)
+        self._stats.bytes -= size
+        self._stats.entries = len(self._data)
@@ -1,17 +1,33 @@
 from __future__ import annotations
 
 import logging
-from typing import TYPE_CHECKING
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Iterator, Mapping
 
+import requests
+from facebook_business.adobjects.adaccount import AdAccount
 from facebook_business.api import FacebookAdsApi
 from facebook_business.exceptions import FacebookRequestError
+from facebook_business.session import FacebookSession
+from requests.adapters import HTTPAdapter
 
+from src.facebook.throttle import (
+    account_from_path,
+    parse_account_usage,
+    throttle,
+)
 from src.utils.errors import (
+    CircuitOpenError,
     FacebookBotError,
     InvalidAccountError,
     PermissionError_,
     RateLimitError,
     TokenExpiredError,
+    TransientError,
 )
 
 if TYPE_CHECKING:
@@ -20,28 +36,108 @@ if TYPE_CHECKING:
 logger = logging.getLogger("fb-ads-bot")
 
 
+class ThrottledApi(FacebookAdsApi):
+    """FacebookAdsApi that paces every call on the reported usage headers."""
+
+    def call(
+        self,
+        method,
+        path,
+        params=None,
+        headers=None,
+        files=None,
+        url_override=None,
+        api_version=None,
+    ):
+        account_id = account_from_path(path)
+        throttle.before_call(account_id)
+        try:
+            response = super().call(
+                method, path, params, headers, files, url_override, api_version
+            )
+        except FacebookRequestError as e:
+            throttle.record(account_id, e.http_headers())
+            raise
+        throttle.record(account_id, response.headers())
+        return response
+
+
+# Seconds to wait for a TCP/TLS connection to Graph
+CONNECT_TIMEOUT = 5.0
+
+
 def init_facebook_api(settings: Settings) -> FacebookAdsApi:
-    api = FacebookAdsApi.init(
+    session = _pooled_session(settings)
+    api = ThrottledApi(session)
+    # SDK objects look up the default on the base class
+    FacebookAdsApi.set_default_api(api)
+    logger.info(
+        "Facebook Ads API initialized (pool=%d, timeout=%.0fs)",
+        settings.http_pool_size,
+        settings.http_timeout,
+    )
+    return api
+
+
+def _pooled_session(settings: Settings) -> FacebookSession:
+    """FacebookSession sharing one keep-alive connection pool across threads.
+
+    The pool blocks when every connection is busy instead of opening
+    throwaway ones, so worker threads reuse warm TLS connections. Retries
+    are left to safe_api_call.
+    """
+    session = FacebookSession(
         app_id=settings.facebook_app_id,
         app_secret=settings.facebook_app_secret,
         access_token=settings.facebook_access_token,
+        timeout=(CONNECT_TIMEOUT, settings.http_timeout),
     )
-    logger.info("Facebook Ads API initialized")
-    return api
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.http_pool_size,
+        pool_block=True,
+        max_retries=0,
+    )
+    session.requests.mount("https://", adapter)
+    session.requests.headers["Connection"] = "keep-alive"
+    return session
 
 
 def classify_error(exc: FacebookRequestError) -> FacebookBotError:
-    code = exc.api_error_code()
-    subcode = exc.api_error_subcode() or 0
-    msg = exc.api_error_message() or str(exc)
+    return classify_error_payload(
+        code=exc.api_error_code(),
+        subcode=exc.api_error_subcode() or 0,
+        msg=exc.api_error_message() or str(exc),
+        transient=bool(exc.api_transient_error()),
+        http_status=exc.http_status(),
+        headers=exc.http_headers() or {},
+    )
+
 
+def classify_error_payload(
+    code: int | None,
+    subcode: int,
+    msg: str,
+    transient: bool = False,
+    http_status: int = 400,
+    headers: Mapping[str, str] | None = None,
+) -> FacebookBotError:
+    """Map a Graph API error (code, subcode, message) to a bot exception."""
     # Token expired / invalid
     if code == 190 or subcode in (463, 467):
         return TokenExpiredError(f"Token error ({code}/{subcode}): {msg}")
 
     # Rate limit
-    if code in (4, 17, 32, 613):
-        return RateLimitError(f"Rate limit ({code}): {msg}")
+    if code in (4, 17, 32, 613, 80000, 80003, 80004, 80014):
+        usage = parse_account_usage(headers or {})
+        retry_after = usage[1] if usage and usage[1] > 0 else None
+        return RateLimitError(
+            f"Rate limit ({code}): {msg}", retry_after=retry_after
+        )
+
+    # Temporary server-side failure
+    if transient or code in (1, 2) or (http_status or 0) >= 500:
+        return TransientError(f"Temporary error ({code}): {msg}")
 
     # Permission
     if code in (10, 200, 273, 294):
@@ -54,9 +150,259 @@ def classify_error(exc: FacebookRequestError) -> FacebookBotError:
     return FacebookBotError(f"Facebook API error ({code}): {msg}")
 
 
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How safe_api_call retries transient and rate-limit errors.
+
+    Delays grow exponentially with full jitter, capped at max_delay. A rate
+    limit that reports its regain time waits exactly that long instead. No
+    retry is attempted once it would end past the per-call deadline.
+    """
+
+    max_attempts: int = 4
+    base_delay: float = 1.0
+    max_delay: float = 20.0
+    deadline: float = 45.0
+    retry_on: tuple[type[FacebookBotError], ...] = (
+        TransientError,
+        RateLimitError,
+    )
+
+    def backoff(self, attempt: int) -> float:
+        ceiling = min(self.max_delay, self.base_delay * 2**attempt)
+        return random.uniform(0, ceiling)
+
+
+DEFAULT_RETRY = RetryPolicy()
+
+_error_counts: Counter[str] = Counter()
+_error_lock = threading.Lock()
+
+
+def error_stats() -> dict[str, int]:
+    """Counts of API errors by class, plus how many retries were made."""
+    with _error_lock:
+        return dict(_error_counts)
+
+
+def count_error(key: str) -> None:
+    with _error_lock:
+        _error_counts[key] += 1
+
+
+# --- Circuit breaker ---
+
+
+@dataclass
+class _Circuit:
+    failures: int = 0
+    opened_at: float | None = None
+    probing: bool = False
+
+
+class CircuitBreaker:
+    """Per-account breaker for accounts that keep failing permanently.
+
+    After `threshold` consecutive permission or invalid-account errors the
+    circuit opens and calls fail fast with CircuitOpenError. Once `cooldown`
+    seconds have passed it goes half-open: a single probe call is let
+    through, which closes the circuit on success or reopens it on failure.
+    """
+
+    trips_on = (PermissionError_, InvalidAccountError)
+
+    def __init__(self, threshold: int = 3, cooldown: float = 15 * 60) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._circuits: dict[str, _Circuit] = {}
+        self._lock = threading.Lock()
+
+    def state(self, account_id: str) -> str:
+        """Return "closed", "open" or "half_open"."""
+        with self._lock:
+            circuit = self._circuits.get(account_id)
+            if circuit is None or circuit.opened_at is None:
+                return "closed"
+            if time.monotonic() - circuit.opened_at < self.cooldown:
+                return "open"
+            return "half_open"
+
+    def is_open(self, account_id: str) -> bool:
+        return self.state(account_id) == "open"
+
+    def open_accounts(self) -> list[str]:
+        with self._lock:
+            ids = list(self._circuits)
+        return [acct for acct in ids if self.is_open(acct)]
+
+    def before_call(self, account_id: str) -> bool:
+        """Raise CircuitOpenError unless a call may go through.
+
+        Returns True if the call is the half-open probe; its caller must
+        then call end_probe() once it is done, however it ends.
+        """
+        with self._lock:
+            circuit = self._circuits.get(account_id)
+            if circuit is None or circuit.opened_at is None:
+                return False
+            remaining = self.cooldown - (time.monotonic() - circuit.opened_at)
+            if remaining <= 0 and not circuit.probing:
+                circuit.probing = True
+                logger.info("Circuit for %s half-open, probing", account_id)
+                return True
+        raise CircuitOpenError(
+            f"{account_id} is suspended after repeated failures, "
+            f"retrying in {max(remaining, 0):.0f}s"
+        )
+
+    def end_probe(self, account_id: str) -> None:
+        """Let another probe through if this one ended without a verdict."""
+        with self._lock:
+            circuit = self._circuits.get(account_id)
+            if circuit is not None:
+                circuit.probing = False
+
+    def record_success(self, account_id: str) -> None:
+        with self._lock:
+            circuit = self._circuits.pop(account_id, None)
+        if circuit is not None and circuit.opened_at is not None:
+            logger.info("Circuit for %s closed", account_id)
+
+    def record_failure(self, account_id: str, error: Exception) -> None:
+        with self._lock:
+            circuit = self._circuits.get(account_id)
+            was_probing = circuit is not None and circuit.probing
+            if circuit is not None:
+                circuit.probing = False
+            if not isinstance(error, self.trips_on):
+                return
+            circuit = self._circuits.setdefault(account_id, _Circuit())
+            circuit.failures += 1
+            if was_probing or circuit.failures >= self.threshold:
+                circuit.opened_at = time.monotonic()
+                logger.warning(
+                    "Circuit for %s opened after %d failures: %s",
+                    account_id,
+                    circuit.failures,
+                    error,
+                )
+
+
+breaker = CircuitBreaker()
+
+
+def _account_of(func, args: tuple) -> str | None:
+    """Find the ad account a call targets, if it is account-scoped."""
+    owner = getattr(func, "__self__", None)
+    if isinstance(owner, AdAccount):
+        return owner.get("id")
+    if isinstance(owner, FacebookAdsApi) and len(args) >= 2:
+        return account_from_path(args[1])
+    return None
+
+
 def safe_api_call(func, *args, **kwargs):
-    """Wraps a Facebook API call, translating errors to custom exceptions."""
+    """Wraps a Facebook API call, translating errors to custom exceptions.
+
+    Transient and rate-limit errors are retried per DEFAULT_RETRY; token,
+    permission and invalid-account errors fail immediately. Calls scoped to
+    an ad account go through that account's circuit breaker.
+    """
+    account_id = _account_of(func, args)
+    probe = bool(account_id) and breaker.before_call(account_id)
     try:
-        return func(*args, **kwargs)
-    except FacebookRequestError as e:
-        raise classify_error(e) from e
+        return _call_with_retries(func, args, kwargs, account_id)
+    finally:
+        # An error record_failure never saw must not leave the probe taken
+        if probe:
+            breaker.end_probe(account_id)
+
+
+def _call_with_retries(
+    func, args: tuple, kwargs: dict[str, Any], account_id: str | None
+):
+    policy = DEFAULT_RETRY
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        try:
+            result = func(*args, **kwargs)
+        except FacebookRequestError as e:
+            error, cause = classify_error(e), e
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error, cause = TransientError(f"Network error: {e}"), e
+        except RateLimitError as e:  # refused by the throttle
+            error, cause = e, None
+        else:
+            if account_id:
+                breaker.record_success(account_id)
+            return result
+
+        count_error(type(error).__name__)
+        attempt += 1
+        retryable = isinstance(error, policy.retry_on)
+        delay = getattr(error, "retry_after", None) or policy.backoff(attempt)
+        if (
+            not retryable
+            or attempt >= policy.max_attempts
+            or time.monotonic() - started + delay > policy.deadline
+        ):
+            if account_id:
+                breaker.record_failure(account_id, error)
+            raise error from cause
+
+        count_error("retries")
+        logger.warning(
+            "%s failed (%s), retry %d/%d in %.1fs",
+            getattr(func, "__qualname__", func),
+            error,
+            attempt,
+            policy.max_attempts - 1,
+            delay,
+        )
+        time.sleep(delay)
+
+
+# --- Streaming ---
+
+
+def iter_graph_pages(
+    path: tuple[str, ...], params: dict[str, Any]
+) -> Iterator[list[dict[str, Any]]]:
+    """Yield raw pages of a Graph edge, fetching the next one only on demand.
+
+    Each page is a separate safe_api_call, so it gets the same retries,
+    throttling and circuit breaking as any other call.
+    """
+    api = FacebookAdsApi.get_default_api()
+    target: tuple[str, ...] | str | None = path
+    while target:
+        response = safe_api_call(api.call, "GET", target, params=params).json()
+        yield response.get("data", [])
+        target = response.get("paging", {}).get("next")
+        params = {}
+
+
+def iter_graph(
+    path: tuple[str, ...], params: dict[str, Any]
+) -> Iterator[dict[str, Any]]:
+    """Yield raw items of a Graph edge page by page."""
+    for page in iter_graph_pages(path, params):
+        yield from page
+
+
+def get_graph_page(
+    path: tuple[str, ...], params: dict[str, Any]
+) -> tuple[list[dict[str, Any]], str | None]:
+    """Fetch a single page of a Graph edge and the cursor of the next one."""
+    api = FacebookAdsApi.get_default_api()
+    response = safe_api_call(api.call, "GET", path, params=params).json()
+    return response.get("data", []), next_cursor(response)
+
+
+def next_cursor(body: dict[str, Any]) -> str | None:
+    """The `after` cursor of a Graph page, or None if it is the last one."""
+    paging = body.get("paging", {})
+    if not paging.get("next"):
+        return None
+    return paging.get("cursors", {}).get("after")
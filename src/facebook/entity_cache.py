@@ -0,0 +1,87 @@
+"""In-memory index of campaigns, ad sets and ads with parent links.
+
+Filled by the management list calls and invalidated by status and budget
+updates, so looking up an entity while navigating needs no API round trip.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any
+
+
+class EntityIndex:
+    def __init__(self) -> None:
+        self._entities: dict[str, dict[str, Any]] = {}
+        self._types: dict[str, str] = {}
+        self._parents: dict[str, str] = {}
+        self._children: dict[str, list[str]] = {}
+        self._lock = threading.Lock()
+
+    def put_children(
+        self, parent_id: str, entity_type: str, items: list[dict[str, Any]]
+    ) -> None:
+        """Record the full, ordered child list of a parent."""
+        with self._lock:
+            for old_id in self._children.get(parent_id, []):
+                self._drop(old_id)
+            for item in items:
+                self._entities[item["id"]] = item
+                self._types[item["id"]] = entity_type
+                self._parents[item["id"]] = parent_id
+            self._children[parent_id] = [item["id"] for item in items]
+
+    def put(
+        self, parent_id: str, entity_type: str, items: list[dict[str, Any]]
+    ) -> None:
+        """Record some children of a parent, e.g. one page of them.
+
+        The parent's child list is left alone, since it is not known to be
+        complete.
+        """
+        with self._lock:
+            for item in items:
+                self._entities[item["id"]] = item
+                self._types[item["id"]] = entity_type
+                self._parents[item["id"]] = parent_id
+
+    def get(self, entity_type: str, entity_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            if self._types.get(entity_id) != entity_type:
+                return None
+            return self._entities.get(entity_id)
+
+    def children(self, parent_id: str) -> list[dict[str, Any]] | None:
+        """Return the cached child list, or None if it is not known."""
+        with self._lock:
+            ids = self._children.get(parent_id)
+            if ids is None:
+                return None
+            return [self._entities[i] for i in ids]
+
+    def parent(self, entity_id: str) -> str | None:
+        with self._lock:
+            return self._parents.get(entity_id)
+
+    def invalidate(self, entity_id: str) -> None:
+        """Forget an entity and its parent's child list."""
+        with self._lock:
+            parent_id = self._parents.get(entity_id)
+            if parent_id is not None:
+                for sibling in self._children.pop(parent_id, []):
+                    self._drop(sibling)
+            self._drop(entity_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entities.clear()
+            self._types.clear()
+            self._parents.clear()
+            self._children.clear()
+
+    def _drop(self, entity_id: str) -> None:
+        self._entities.pop(entity_id, None)
+        self._types.pop(entity_id, None)
+        self._parents.pop(entity_id, None)
+
+
+entities = EntityIndex()
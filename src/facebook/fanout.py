@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+
+async def fetch_accounts(
+    account_ids: list[str], fetch: Callable[[str], Awaitable[Any]]
+) -> AsyncIterator[tuple[str, Any]]:
+    """Run the aio facade call fetch(account_id) for every account at once.
+
+    Yields (account_id, result) in account order, each one as soon as it and
+    every account before it have finished. A failing fetch yields its
+    exception in place of the result so the remaining accounts still run.
+    """
+    tasks = [asyncio.ensure_future(fetch(acct)) for acct in account_ids]
+    try:
+        for acct, task in zip(account_ids, tasks):
+            try:
+                result = await task
+            except Exception as e:
+                result = e
+            yield acct, result
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,177 @@
+"""Columnar, NumPy-backed table of insight rows.
+
+Breakdown and entity-level queries return hundreds or thousands of rows.
+Keeping each metric as one array lets roll-ups, rankings and derived
+ratios run as vectorised operations instead of per-row dict work.
+"""
+from __future__ import annotations
+
+from typing import Any, Sequence
+
+import numpy as np
+
+from src.facebook.actions import ActionMatrix
+
+METRICS = ("spend", "impressions", "clicks", "leads")
+
+
+class InsightTable:
+    """Dimension columns (strings) plus metric columns (float64).
+
+    Every column has the same length; row i of the table is the i-th
+    element of each column. The optional action matrix keeps every action
+    type's count per row, so any conversion can be ranked or rolled up.
+    """
+
+    def __init__(
+        self,
+        dims: dict[str, np.ndarray],
+        metrics: dict[str, np.ndarray],
+        actions: ActionMatrix | None = None,
+    ) -> None:
+        self.dims = dims
+        self.metrics = metrics
+        self.actions = actions
+
+    @classmethod
+    def from_columns(
+        cls,
+        dims: dict[str, Sequence[str]],
+        metrics: dict[str, Sequence[float]],
+        actions: ActionMatrix | None = None,
+    ) -> InsightTable:
+        return cls(
+            {name: np.asarray(col, dtype=str) for name, col in dims.items()},
+            {
+                name: np.asarray(metrics.get(name, ()), dtype=np.float64)
+                for name in METRICS
+            },
+            actions,
+        )
+
+    @classmethod
+    def concat(cls, tables: Sequence[InsightTable]) -> InsightTable:
+        """Stack tables with the same columns, e.g. one per fetched page."""
+        if len(tables) == 1:
+            return tables[0]
+        first = tables[0]
+        actions = [t.actions for t in tables if t.actions is not None]
+        return cls(
+            {
+                name: np.concatenate([t.dims[name] for t in tables])
+                for name in first.dims
+            },
+            {
+                name: np.concatenate([t.metrics[name] for t in tables])
+                for name in first.metrics
+            },
+            ActionMatrix.concat(actions) if len(actions) == len(tables) else None,
+        )
+
+    def __len__(self) -> int:
+        return len(self.metrics["spend"])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name in self.dims:
+            return self.dims[name]
+        if name in self.metrics:
+            return self.metrics[name]
+        return getattr(self, name)()
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the columns, as counted by the insights cache."""
+        arrays = [*self.dims.values(), *self.metrics.values()]
+        if self.actions is not None:
+            arrays.append(self.actions.values)
+        return sum(a.nbytes for a in arrays)
+
+    # --- Derived metrics ---
+
+    def conversion(self, action_type: str) -> np.ndarray:
+        """Count of any action type per row (zeros if it never occurred)."""
+        if self.actions is None:
+            return np.zeros(len(self))
+        return self.actions.get(action_type)
+
+    def cpl(self) -> np.ndarray:
+        """Cost per lead; NaN where there were no leads."""
+        return _ratio(self.metrics["spend"], self.metrics["leads"])
+
+    def cpm(self) -> np.ndarray:
+        return _ratio(self.metrics["spend"] * 1000, self.metrics["impressions"])
+
+    def ctr(self) -> np.ndarray:
+        """Click-through rate in percent."""
+        return _ratio(self.metrics["clicks"] * 100, self.metrics["impressions"])
+
+    def totals(self) -> dict[str, float]:
+        totals = {name: float(col.sum()) for name, col in self.metrics.items()}
+        totals["cpl"] = (
+            totals["spend"] / totals["leads"] if totals["leads"] else None
+        )
+        return totals
+
+    # --- Reshaping ---
+
+    def take(self, index: np.ndarray) -> InsightTable:
+        return InsightTable(
+            {name: col[index] for name, col in self.dims.items()},
+            {name: col[index] for name, col in self.metrics.items()},
+            self.actions.take(index) if self.actions is not None else None,
+        )
+
+    def rollup(self, by: Sequence[str]) -> InsightTable:
+        """Sum the metrics over every distinct combination of `by` columns."""
+        if not by:
+            dims: dict[str, np.ndarray] = {}
+            group = np.zeros(len(self), dtype=np.intp)
+            n_groups = 1
+        else:
+            uniques, codes = [], []
+            for name in by:
+                values, inverse = np.unique(self.dims[name], return_inverse=True)
+                uniques.append(values)
+                codes.append(inverse.ravel())
+            shape = tuple(max(len(u), 1) for u in uniques)
+            combined = np.ravel_multi_index(codes, shape)
+            keys, group = np.unique(combined, return_inverse=True)
+            group = group.ravel()
+            n_groups = len(keys)
+            positions = np.unravel_index(keys, shape)
+            dims = {name: u[pos] for name, u, pos in zip(by, uniques, positions)}
+
+        return InsightTable(
+            dims,
+            {
+                name: np.bincount(group, weights=col, minlength=n_groups)
+                for name, col in self.metrics.items()
+            },
+            self.actions.rollup(group, n_groups) if self.actions is not None else None,
+        )
+
+    def top(self, n: int, by: str = "spend", ascending: bool = False) -> InsightTable:
+        """The n rows with the highest (or lowest) value of `by`.
+
+        Rows where `by` is NaN, such as CPL without leads, always sort last.
+        """
+        values = self[by]
+        key = values if ascending else -values
+        order = np.argsort(np.where(np.isnan(key), np.inf, key), kind="stable")
+        return self.take(order[:n])
+
+    def records(self) -> list[dict[str, Any]]:
+        """Rows as dicts, with derived metrics; NaN ratios become None."""
+        columns = {name: col.tolist() for name, col in self.dims.items()}
+        columns.update({name: col.tolist() for name, col in self.metrics.items()})
+        for name in ("cpl", "cpm", "ctr"):
+            columns[name] = [
+                None if np.isnan(v) else v for v in getattr(self, name)().tolist()
+            ]
+        return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    out = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out
@@ -1,12 +1,36 @@
 from __future__ import annotations
 
+import json
 import logging
-from datetime import datetime, timedelta
-from typing import Any
+import time
+from datetime import date
+from functools import partial
+from typing import Any, Iterator
+
+import numpy as np
 
 from facebook_business.adobjects.adaccount import AdAccount
+from facebook_business.api import FacebookAdsApi, FacebookResponse
 
-from src.facebook.client import safe_api_call
+from src.facebook import planner, reports
+from src.facebook.actions import parse_actions
+from src.facebook.cache import TTLCache
+from src.facebook.insight_table import InsightTable
+from src.facebook.client import (
+    DEFAULT_RETRY,
+    breaker,
+    classify_error,
+    count_error,
+    iter_graph_pages,
+    safe_api_call,
+)
+from src.facebook.throttle import throttle
+from src.utils.errors import (
+    CircuitOpenError,
+    FacebookBotError,
+    RateLimitError,
+    TransientError,
+)
 
 logger = logging.getLogger("fb-ads-bot")
 
@@ -21,56 +45,100 @@ INSIGHT_FIELDS = [
     "cost_per_action_type",
 ]
 
+# Conversion metrics on every parsed row, by action type
+CONVERSIONS = {
+    "leads": "lead",
+    "messages": "onsite_conversion.messaging_conversation_started_7d",
+    "purchases": "purchase",
+}
 
-def _extract_cpl(row: dict[str, Any]) -> float | None:
-    """Extract cost-per-lead from cost_per_action_type."""
-    for item in row.get("cost_per_action_type", []):
-        if item.get("action_type") == "lead":
-            return float(item["value"])
-    return None
+# Graph API limit on sub-requests per batch call
+BATCH_LIMIT = 50
+BATCH_RETRIES = 2
 
+# Daily rows per page for time_increment=1 queries
+SERIES_PAGE_LIMIT = 500
+BREAKDOWN_PAGE_LIMIT = 500
 
-def _extract_leads(row: dict[str, Any]) -> int:
-    """Extract lead count from actions."""
-    for item in row.get("actions", []):
-        if item.get("action_type") == "lead":
-            return int(item["value"])
-    return 0
+# Extra fields identifying the entity each row belongs to, per level
+LEVEL_FIELDS = {
+    "account": [],
+    "campaign": ["campaign_id", "campaign_name"],
+    "adset": ["adset_id", "adset_name"],
+    "ad": ["ad_id", "ad_name"],
+}
+# Graph breakdown columns behind each supported breakdown
+BREAKDOWNS = {
+    "age": ["age"],
+    "gender": ["gender"],
+    "placement": ["publisher_platform", "platform_position"],
+}
 
+# Facebook keeps restating a day's numbers until its attribution window
+# has passed; after that the day is settled and safe to keep forever.
+SETTLE_DAYS = 7
+RECENT_TTL = 5 * 60  # today / yesterday
+UNSETTLED_TTL = 60 * 60  # inside the attribution window
 
-def _parse_row(row: dict[str, Any]) -> dict[str, Any]:
-    return {
-        "account_name": row.get("account_name", "Unknown"),
-        "impressions": int(row.get("impressions", 0)),
-        "clicks": int(row.get("clicks", 0)),
-        "cpm": float(row.get("cpm", 0)),
-        "frequency": float(row.get("frequency", 0)),
-        "spend": float(row.get("spend", 0)),
-        "leads": _extract_leads(row),
-        "cpl": _extract_cpl(row),
-        "date_start": row.get("date_start", ""),
-        "date_stop": row.get("date_stop", ""),
+_cache = TTLCache()
+
+
+def cache_stats() -> dict[str, int]:
+    """Hit/miss/eviction counters for the insights cache."""
+    return _cache.stats()
+
+
+def _parse_rows(rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Parse raw insight rows, reading each row's action lists only once.
+
+    Every CONVERSIONS metric comes from the same action matrix; CPL is the
+    reported cost per lead, or None without leads.
+    """
+    actions = parse_actions(rows, "actions")
+    costs = parse_actions(rows, "cost_per_action_type", missing=np.nan)
+    conversions = {
+        name: actions.get(action_type).astype(int).tolist()
+        for name, action_type in CONVERSIONS.items()
     }
+    cpl = [None if np.isnan(v) else v for v in costs.get("lead").tolist()]
+
+    parsed = []
+    for j, row in enumerate(rows):
+        out = {
+            "account_name": row.get("account_name", "Unknown"),
+            "impressions": int(row.get("impressions", 0)),
+            "clicks": int(row.get("clicks", 0)),
+            "cpm": float(row.get("cpm", 0)),
+            "frequency": float(row.get("frequency", 0)),
+            "spend": float(row.get("spend", 0)),
+        }
+        for name, values in conversions.items():
+            out[name] = values[j]
+        out["cpl"] = cpl[j]
+        out["date_start"] = row.get("date_start", "")
+        out["date_stop"] = row.get("date_stop", "")
+        parsed.append(out)
+    return parsed
 
 
 def get_daily_insights(account_id: str) -> dict[str, Any] | None:
-    """Fetch yesterday's aggregated insights for an ad account."""
-    account = AdAccount(account_id)
-    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    """Fetch yesterday's aggregated insights for an ad account.
+
+    "Yesterday" is the previous day in the account's own timezone.
+    """
+    planner.resolve_timezones([account_id])
+    yesterday = planner.yesterday(account_id).isoformat()
 
     params = {
         "time_range": {"since": yesterday, "until": yesterday},
         "level": "account",
     }
 
-    rows = safe_api_call(
-        account.get_insights, fields=INSIGHT_FIELDS, params=params
-    )
-    data = list(rows)
+    data = _fetch_rows(account_id, params)
     if not data:
         return None
 
-    return _parse_row(data[0])
+    return _parse_rows(data[:1])[0]
 
 
 def get_comparison_insights(
@@ -78,32 +146,437 @@ def get_comparison_insights(
 ) -> dict[str, dict[str, Any] | None]:
     """Fetch current period vs previous period insights for comparison.
 
+    Both periods come back from one request via time_ranges.
     Returns {"current": {...}, "previous": {...}} or None values if no data.
     """
-    account = AdAccount(account_id)
-    today = datetime.now().date()
-
-    current_end = today - timedelta(days=1)
-    current_start = current_end - timedelta(days=days - 1)
-    previous_end = current_start - timedelta(days=1)
-    previous_start = previous_end - timedelta(days=days - 1)
-
-    result = {}
-    for label, start, end in [
-        ("current", current_start, current_end),
-        ("previous", previous_start, previous_end),
-    ]:
-        params = {
-            "time_range": {
-                "since": start.strftime("%Y-%m-%d"),
-                "until": end.strftime("%Y-%m-%d"),
-            },
-            "level": "account",
-        }
-        rows = safe_api_call(
-            account.get_insights, fields=INSIGHT_FIELDS, params=params
+    planner.resolve_timezones([account_id])
+    periods = planner.comparison_periods(account_id, days)
+    rows = _fetch_rows(account_id, _comparison_params(periods))
+    return _split_periods(rows, periods)
+
+
+def get_daily_series(
+    account_id: str, since: str, until: str
+) -> list[dict[str, Any]]:
+    """Fetch one parsed row per day between since and until (inclusive).
+
+    Days without any delivery are omitted by the API.
+    """
+    rows = _fetch_rows(account_id, _series_params(since, until))
+    return _parse_rows(rows)
+
+
+def iter_insights(
+    account_id: str, params: dict[str, Any], fields: list[str] = INSIGHT_FIELDS
+) -> Iterator[dict[str, Any]]:
+    """Stream parsed insight rows for any query, one page at a time.
+
+    Nothing is cached or materialised, so callers can start aggregating
+    large (e.g. ad-level) results before the last page arrives.
+    """
+    for page in _iter_raw_pages(account_id, params, fields):
+        yield from _parse_rows(page)
+
+
+def get_breakdown_table(
+    account_id: str,
+    level: str = "campaign",
+    breakdown: str | None = None,
+    days: int = 7,
+) -> InsightTable:
+    """Fetch the last `days` days per entity at `level` as an InsightTable.
+
+    Dimension columns are the level's id/name fields plus the Graph columns
+    of `breakdown` (one of BREAKDOWNS), if given.
+    """
+    planner.resolve_timezones([account_id])
+    params, fields, dims = _breakdown_query(account_id, level, breakdown, days)
+    key = _table_key(account_id, params, fields)
+    table = _cache.get(key)
+    if table is None:
+        # Each page becomes columns as it arrives, so ad-level breakdowns
+        # never hold all their rows as dicts at once
+        pages = _iter_raw_pages(account_id, params, fields)
+        table = _concat_pages([_to_table(page, dims) for page in pages], dims)
+        _cache.set(key, table, _ttl_for(account_id, params))
+    return table
+
+
+# --- Batched multi-account fetching ---
+
+
+def get_batched_insights(
+    windows: list[tuple[str, str, str]],
+) -> dict[tuple[str, str, str], dict[str, Any] | None | FacebookBotError]:
+    """Fetch account-level insights for many (account_id, since, until) windows.
+
+    Sub-requests are packed BATCH_LIMIT at a time into single Graph batch
+    calls. Each window maps to its parsed row, None when there is no data,
+    or the FacebookBotError raised for that sub-request alone.
+    """
+    requests = {
+        key: (
+            key[0],
+            {"time_range": {"since": key[1], "until": key[2]}, "level": "account"},
         )
-        data = list(rows)
-        result[label] = _parse_row(data[0]) if data else None
+        for key in windows
+    }
+    results = {}
+    for key, rows in _execute_batched(requests).items():
+        if isinstance(rows, FacebookBotError):
+            results[key] = rows
+        else:
+            results[key] = _parse_rows(rows[:1])[0] if rows else None
+    return results
+
+
+def get_daily_insights_many(
+    account_ids: list[str],
+) -> dict[str, dict[str, Any] | None | FacebookBotError]:
+    """Batched get_daily_insights for several accounts."""
+    planner.resolve_timezones(account_ids)
+    windows = {}
+    for acct in account_ids:
+        yesterday = planner.yesterday(acct).isoformat()
+        windows[acct] = (acct, yesterday, yesterday)
+    rows = get_batched_insights(list(windows.values()))
+    return {acct: rows[key] for acct, key in windows.items()}
+
+
+def get_comparison_insights_many(
+    account_ids: list[str], days: int = 7
+) -> dict[str, dict[str, dict[str, Any] | None] | FacebookBotError]:
+    """Batched get_comparison_insights for several accounts.
+
+    Each account is a single time_ranges sub-request. An account whose
+    sub-request failed maps to that error instead of a comparison dict.
+    """
+    planner.resolve_timezones(account_ids)
+    periods = {
+        acct: planner.comparison_periods(acct, days) for acct in account_ids
+    }
+    responses = _execute_batched(
+        {acct: (acct, _comparison_params(periods[acct])) for acct in account_ids}
+    )
+
+    result: dict = {}
+    for acct in account_ids:
+        rows = responses[acct]
+        if isinstance(rows, FacebookBotError):
+            result[acct] = rows
+        else:
+            result[acct] = _split_periods(rows, periods[acct])
+    return result
+
 
+def get_daily_series_many(
+    ranges: dict[str, tuple[str, str]],
+) -> dict[str, list[dict[str, Any]] | FacebookBotError]:
+    """Batched get_daily_series for {account_id: (since, until)}."""
+    return _series_batch(
+        {acct: (acct, since, until) for acct, (since, until) in ranges.items()}
+    )
+
+
+def fetch_plan(
+    plan: planner.FetchPlan,
+) -> dict[str, list[dict[str, Any]] | FacebookBotError]:
+    """Run a FetchPlan: every planned range goes out in one batched pass.
+
+    Returns each account's parsed daily rows across all of its ranges, or
+    the first error one of its ranges hit.
+    """
+    ranges = plan.ranges()
+    series = _series_batch(
+        {
+            (acct, since, until): (acct, since.isoformat(), until.isoformat())
+            for acct, spans in ranges.items()
+            for since, until in spans
+        }
+    )
+    result: dict = {}
+    for acct, spans in ranges.items():
+        rows: list[dict[str, Any]] = []
+        for since, until in spans:
+            part = series[(acct, since, until)]
+            if isinstance(part, FacebookBotError):
+                rows = part
+                break
+            rows.extend(part)
+        result[acct] = rows
     return result
+
+
+def _series_batch(
+    requests: dict[Any, tuple[str, str, str]],
+) -> dict[Any, list[dict[str, Any]] | FacebookBotError]:
+    """Daily series for {key: (account_id, since, until)} in Graph batches.
+
+    Batched sub-requests are not paginated, so ranges large enough to need
+    a report job (e.g. multi-month backfills) are fetched one by one.
+    """
+    queries = {
+        key: (acct, _series_params(since, until))
+        for key, (acct, since, until) in requests.items()
+    }
+    large = {
+        key for key, (_, params) in queries.items()
+        if reports.should_use_report(params)
+    }
+    responses = _execute_batched(
+        {key: q for key, q in queries.items() if key not in large}
+    )
+    for key in large:
+        acct, params = queries[key]
+        try:
+            responses[key] = _fetch_rows(acct, params)
+        except FacebookBotError as e:
+            responses[key] = e
+    return {
+        key: (
+            rows
+            if isinstance(rows, FacebookBotError)
+            else _parse_rows(rows)
+        )
+        for key, rows in responses.items()
+    }
+
+
+def _execute_batched(
+    requests: dict[Any, tuple[str, dict[str, Any]]],
+) -> dict[Any, list[dict[str, Any]] | FacebookBotError]:
+    """Run {key: (account_id, params)} insights requests as Graph batches.
+
+    Sub-requests that fail transiently or get no response are re-sent up to
+    BATCH_RETRIES times. Accounts Facebook has blocked are not sent; their
+    keys get a RateLimitError with the time until access is regained.
+    Returns {key: raw rows} or {key: FacebookBotError} per sub-request.
+    """
+    api = FacebookAdsApi.get_default_api()
+    results: dict = {}
+    keys = []
+    for key, (account_id, params) in requests.items():
+        cached = _cache.get(_cache_key(account_id, params))
+        if cached is not None:
+            results[key] = cached
+        elif breaker.is_open(account_id):
+            results[key] = CircuitOpenError(
+                f"{account_id} is suspended after repeated failures"
+            )
+        else:
+            keys.append(key)
+
+    for i in range(0, len(keys), BATCH_LIMIT):
+        pending = keys[i : i + BATCH_LIMIT]
+        for attempt in range(BATCH_RETRIES + 1):
+            batch = api.new_batch()
+            for key in pending:
+                results.pop(key, None)
+                account_id, params = requests[key]
+                # Usage headers of earlier sub-responses may have blocked it
+                retry_after = throttle.retry_after(account_id)
+                if retry_after > 0:
+                    results[key] = RateLimitError(
+                        f"Rate limited for {account_id}, "
+                        f"access regained in {retry_after:.0f}s",
+                        retry_after=retry_after,
+                    )
+                    continue
+                AdAccount(account_id).get_insights(
+                    fields=INSIGHT_FIELDS,
+                    params=params,
+                    batch=batch,
+                    success=partial(
+                        _on_batch_success, results, key, account_id, params
+                    ),
+                    failure=partial(
+                        _on_batch_failure, results, key, account_id
+                    ),
+                )
+            if len(batch) == 0:
+                break
+            safe_api_call(batch.execute)
+
+            # Sub-requests that got no response at all (e.g. timed out inside
+            # the batch) or a transient error go into the next round
+            pending = [
+                key
+                for key in pending
+                if isinstance(results.get(key), (TransientError, type(None)))
+            ]
+            if not pending:
+                break
+            if attempt < BATCH_RETRIES:
+                time.sleep(DEFAULT_RETRY.backoff(attempt + 1))
+
+        for key in pending:
+            if key not in results:
+                results[key] = FacebookBotError(
+                    f"No response for {requests[key][0]} in batch"
+                )
+
+    return results
+
+
+def _on_batch_success(
+    results: dict,
+    key: Any,
+    account_id: str,
+    params: dict[str, Any],
+    response: FacebookResponse,
+) -> None:
+    throttle.record(account_id, response.headers())
+    rows = response.json().get("data", [])
+    _cache.set(
+        _cache_key(account_id, params), rows, _ttl_for(account_id, params)
+    )
+    breaker.record_success(account_id)
+    results[key] = rows
+
+
+def _on_batch_failure(
+    results: dict, key: Any, account_id: str, response: FacebookResponse
+) -> None:
+    throttle.record(account_id, response.headers())
+    error = classify_error(response.error())
+    count_error(type(error).__name__)
+    breaker.record_failure(account_id, error)
+    results[key] = error
+
+
+# --- Cached single-account fetching ---
+
+
+def _fetch_rows(
+    account_id: str, params: dict[str, Any], fields: list[str] = INSIGHT_FIELDS
+) -> list[dict[str, Any]]:
+    """Run an insights query, serving it from the cache when possible."""
+    key = _cache_key(account_id, params, fields)
+    rows = _cache.get(key)
+    if rows is not None:
+        return rows
+
+    rows = list(_iter_raw(account_id, params, fields))
+    _cache.set(key, rows, _ttl_for(account_id, params))
+    return rows
+
+
+def _iter_raw(
+    account_id: str, params: dict[str, Any], fields: list[str] = INSIGHT_FIELDS
+) -> Iterator[dict[str, Any]]:
+    for page in _iter_raw_pages(account_id, params, fields):
+        yield from page
+
+
+def _iter_raw_pages(
+    account_id: str, params: dict[str, Any], fields: list[str] = INSIGHT_FIELDS
+) -> Iterator[list[dict[str, Any]]]:
+    """Raw row pages of a query, run as a report job when it is large."""
+    query = dict(params, fields=",".join(fields))
+    if reports.should_use_report(params):
+        return reports.iter_report_pages(account_id, query)
+    return iter_graph_pages((account_id, "insights"), query)
+
+
+def _cache_key(
+    account_id: str, params: dict[str, Any], fields: list[str] = INSIGHT_FIELDS
+) -> tuple[str, ...]:
+    return (
+        account_id,
+        params.get("level", "account"),
+        ",".join(fields),
+        json.dumps(params, sort_keys=True),
+    )
+
+
+def _table_key(
+    account_id: str, params: dict[str, Any], fields: list[str]
+) -> tuple[str, ...]:
+    """Cache key of a query kept as an InsightTable rather than raw rows."""
+    return _cache_key(account_id, params, fields) + ("table",)
+
+
+def _ttl_for(account_id: str, params: dict[str, Any]) -> float | None:
+    """TTL for a query, driven by the most recent day it covers.
+
+    Days are the account's own, so their age is counted from its today.
+    """
+    ranges = params.get("time_ranges") or [params["time_range"]]
+    last = max(date.fromisoformat(r["until"]) for r in ranges)
+    age = (planner.today(account_id) - last).days
+    if age <= 1:
+        return RECENT_TTL
+    if age <= SETTLE_DAYS:
+        return UNSETTLED_TTL
+    return None
+
+
+# --- Query parameters ---
+
+
+def _series_params(since: str, until: str) -> dict[str, Any]:
+    return {
+        "time_range": {"since": since, "until": until},
+        "time_increment": 1,
+        "level": "account",
+        "limit": SERIES_PAGE_LIMIT,
+    }
+
+
+def _comparison_params(periods: list[tuple[str, str, str]]) -> dict[str, Any]:
+    return {
+        "time_ranges": [
+            {"since": since, "until": until} for _, since, until in periods
+        ],
+        "level": "account",
+    }
+
+
+def _breakdown_query(
+    account_id: str, level: str, breakdown: str | None, days: int
+) -> tuple[dict[str, Any], list[str], list[str]]:
+    """Return (params, fields, dimension columns) for get_breakdown_table."""
+    if level not in LEVEL_FIELDS:
+        raise ValueError(f"Unknown insights level: {level}")
+    if breakdown is not None and breakdown not in BREAKDOWNS:
+        raise ValueError(f"Unknown breakdown: {breakdown}")
+    since, until = planner.last_days(account_id, days)
+    params: dict[str, Any] = {
+        "time_range": {"since": since.isoformat(), "until": until.isoformat()},
+        "level": level,
+        "limit": BREAKDOWN_PAGE_LIMIT,
+    }
+    breakdown_cols = BREAKDOWNS[breakdown] if breakdown else []
+    if breakdown_cols:
+        params["breakdowns"] = breakdown_cols
+    dims = LEVEL_FIELDS[level] + breakdown_cols
+    return params, INSIGHT_FIELDS + LEVEL_FIELDS[level], dims
+
+
+def _to_table(rows: list[dict[str, Any]], dims: list[str]) -> InsightTable:
+    actions = parse_actions(rows, "actions")
+    return InsightTable.from_columns(
+        {dim: [row.get(dim, "") for row in rows] for dim in dims},
+        {
+            "spend": [row.get("spend", 0) for row in rows],
+            "impressions": [row.get("impressions", 0) for row in rows],
+            "clicks": [row.get("clicks", 0) for row in rows],
+            "leads": actions.get(CONVERSIONS["leads"]),
+        },
+        actions,
+    )
+
+
+def _concat_pages(tables: list[InsightTable], dims: list[str]) -> InsightTable:
+    return InsightTable.concat(tables) if tables else _to_table([], dims)
+
+
+def _split_periods(
+    rows: list[dict[str, Any]], periods: list[tuple[str, str, str]]
+) -> dict[str, dict[str, Any] | None]:
+    """Match time_ranges rows back to their period labels by date_start.
+
+    Ranges without any delivery are omitted by the API and map to None.
+    """
+    by_start = {row["date_start"]: row for row in _parse_rows(rows)}
+    return {label: by_start.get(since) for label, since, _ in periods}
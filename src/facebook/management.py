@@ -1,67 +1,221 @@
 from __future__ import annotations
 
 import logging
-from typing import Any
+from typing import Any, Iterable, Iterator
 
 from facebook_business.adobjects.ad import Ad
-from facebook_business.adobjects.adaccount import AdAccount
 from facebook_business.adobjects.adset import AdSet
 from facebook_business.adobjects.campaign import Campaign
 
-from src.facebook.client import safe_api_call
+from src.facebook.client import get_graph_page, iter_graph, safe_api_call
+from src.facebook.entity_cache import entities
 
 logger = logging.getLogger("fb-ads-bot")
 
+CAMPAIGN_FIELDS = ["name", "status", "daily_budget", "lifetime_budget", "objective"]
+ADSET_FIELDS = ["name", "status", "daily_budget", "lifetime_budget", "campaign_id"]
+AD_FIELDS = ["name", "status", "adset_id"]
+
+# Page size for each level of the nested account tree request
+TREE_PAGE_LIMIT = 100
+# Page size when streaming a single level
+PAGE_LIMIT = 100
+
+# Graph edge and fields of each entity type under its parent
+EDGES = {"campaign": "campaigns", "adset": "adsets", "ad": "ads"}
+FIELDS = {"campaign": CAMPAIGN_FIELDS, "adset": ADSET_FIELDS, "ad": AD_FIELDS}
+
 # --- Listing ---
 
 
 def list_campaigns(account_id: str) -> list[dict[str, Any]]:
-    account = AdAccount(account_id)
-    fields = ["name", "status", "daily_budget", "lifetime_budget", "objective"]
-    items = safe_api_call(account.get_campaigns, fields=fields)
-    return [
-        {
-            "id": c["id"],
-            "name": c["name"],
-            "status": c["status"],
-            "daily_budget": _cents_to_dollars(c.get("daily_budget")),
-            "lifetime_budget": _cents_to_dollars(c.get("lifetime_budget")),
-            "objective": c.get("objective", ""),
-        }
-        for c in items
-    ]
+    campaigns = list(iter_campaigns(account_id))
+    entities.put_children(account_id, "campaign", campaigns)
+    return campaigns
 
 
 def list_adsets(campaign_id: str) -> list[dict[str, Any]]:
-    campaign = Campaign(campaign_id)
-    fields = ["name", "status", "daily_budget", "lifetime_budget", "campaign_id"]
-    items = safe_api_call(campaign.get_ad_sets, fields=fields)
-    return [
-        {
-            "id": s["id"],
-            "name": s["name"],
-            "status": s["status"],
-            "daily_budget": _cents_to_dollars(s.get("daily_budget")),
-            "lifetime_budget": _cents_to_dollars(s.get("lifetime_budget")),
-            "campaign_id": s.get("campaign_id", ""),
-        }
-        for s in items
-    ]
+    adsets = list(iter_adsets(campaign_id))
+    entities.put_children(campaign_id, "adset", adsets)
+    return adsets
 
 
 def list_ads(adset_id: str) -> list[dict[str, Any]]:
-    adset = AdSet(adset_id)
-    fields = ["name", "status", "adset_id"]
-    items = safe_api_call(adset.get_ads, fields=fields)
-    return [
-        {
-            "id": a["id"],
-            "name": a["name"],
-            "status": a["status"],
-            "adset_id": a.get("adset_id", ""),
-        }
-        for a in items
-    ]
+    ads = list(iter_ads(adset_id))
+    entities.put_children(adset_id, "ad", ads)
+    return ads
+
+
+# --- Streaming ---
+
+
+def iter_campaigns(account_id: str) -> Iterator[dict[str, Any]]:
+    """Yield parsed campaigns, fetching each page only when it is reached."""
+    params = {"fields": ",".join(CAMPAIGN_FIELDS), "limit": PAGE_LIMIT}
+    for c in iter_graph((account_id, "campaigns"), params):
+        yield _campaign_dict(c)
+
+
+def iter_adsets(campaign_id: str) -> Iterator[dict[str, Any]]:
+    params = {"fields": ",".join(ADSET_FIELDS), "limit": PAGE_LIMIT}
+    for s in iter_graph((campaign_id, "adsets"), params):
+        yield _adset_dict(s)
+
+
+def iter_ads(adset_id: str) -> Iterator[dict[str, Any]]:
+    params = {"fields": ",".join(AD_FIELDS), "limit": PAGE_LIMIT}
+    for a in iter_graph((adset_id, "ads"), params):
+        yield _ad_dict(a)
+
+
+# --- Paging ---
+
+
+def list_page(
+    entity_type: str,
+    parent_id: str,
+    after: str | None = None,
+    limit: int = PAGE_LIMIT,
+) -> tuple[list[dict[str, Any]], str | None]:
+    """One page of a parent's campaigns, ad sets or ads.
+
+    Returns the parsed items and the cursor of the next page (None on the
+    last one). Only this page is requested; its items are added to the
+    entity index without replacing the parent's known child list.
+    """
+    raw, cursor = get_graph_page(
+        (parent_id, EDGES[entity_type]), page_params(entity_type, after, limit)
+    )
+    items = parse_entities(entity_type, raw)
+    entities.put(parent_id, entity_type, items)
+    return items, cursor
+
+
+def page_params(
+    entity_type: str, after: str | None, limit: int
+) -> dict[str, Any]:
+    params: dict[str, Any] = {"fields": ",".join(FIELDS[entity_type]), "limit": limit}
+    if after:
+        params["after"] = after
+    return params
+
+
+def parse_entities(
+    entity_type: str, raw: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
+    parse = {"campaign": _campaign_dict, "adset": _adset_dict, "ad": _ad_dict}
+    return [parse[entity_type](item) for item in raw]
+
+
+# --- Account tree ---
+
+
+def get_account_tree(account_id: str) -> list[dict[str, Any]]:
+    """Fetch campaigns, ad sets and ads in one request via nested fields.
+
+    Fills the entity index for every level so keyboards can render ad sets
+    and ads without further calls, and returns the campaign list. A nested
+    edge with more than TREE_PAGE_LIMIT children is re-listed on its own.
+    """
+    raw = iter_graph((account_id, "campaigns"), tree_params())
+    campaigns, more_adsets, more_ads = index_tree(account_id, raw)
+    for campaign_id in more_adsets:
+        list_adsets(campaign_id)
+    for adset_id in more_ads:
+        list_ads(adset_id)
+    logger.info(
+        "Fetched account tree for %s (%d campaigns)", account_id, len(campaigns)
+    )
+    return campaigns
+
+
+def tree_params() -> dict[str, Any]:
+    """Graph params for campaigns with nested ad sets and ads."""
+    ad_fields = ",".join(AD_FIELDS)
+    adset_fields = ",".join(ADSET_FIELDS)
+    tree_field = (
+        f"adsets.limit({TREE_PAGE_LIMIT}){{{adset_fields},"
+        f"ads.limit({TREE_PAGE_LIMIT}){{{ad_fields}}}}}"
+    )
+    return {
+        "fields": ",".join(CAMPAIGN_FIELDS + [tree_field]),
+        "limit": TREE_PAGE_LIMIT,
+    }
+
+
+def index_tree(
+    account_id: str, raw_campaigns: Iterable[dict[str, Any]]
+) -> tuple[list[dict[str, Any]], list[str], list[str]]:
+    """Index raw nested campaigns into the entity cache.
+
+    Returns (campaigns, campaign IDs whose ad sets were truncated, ad set
+    IDs whose ads were truncated); truncated edges are left for the caller
+    to re-list.
+    """
+    campaigns = []
+    more_adsets: list[str] = []
+    more_ads: list[str] = []
+    for raw in raw_campaigns:
+        campaign = _campaign_dict(raw)
+        campaigns.append(campaign)
+
+        adsets_edge = raw.get("adsets", {})
+        if _has_more(adsets_edge):
+            more_adsets.append(campaign["id"])
+            continue
+
+        adsets = []
+        for raw_set in adsets_edge.get("data", []):
+            adset = _adset_dict(raw_set)
+            adsets.append(adset)
+            ads_edge = raw_set.get("ads", {})
+            if _has_more(ads_edge):
+                more_ads.append(adset["id"])
+            else:
+                entities.put_children(
+                    adset["id"],
+                    "ad",
+                    [_ad_dict(a) for a in ads_edge.get("data", [])],
+                )
+        entities.put_children(campaign["id"], "adset", adsets)
+
+    entities.put_children(account_id, "campaign", campaigns)
+    return campaigns, more_adsets, more_ads
+
+
+def _has_more(edge: dict[str, Any]) -> bool:
+    return "next" in edge.get("paging", {})
+
+
+def _campaign_dict(c) -> dict[str, Any]:
+    return {
+        "id": c["id"],
+        "name": c["name"],
+        "status": c["status"],
+        "daily_budget": _cents_to_dollars(c.get("daily_budget")),
+        "lifetime_budget": _cents_to_dollars(c.get("lifetime_budget")),
+        "objective": c.get("objective", ""),
+    }
+
+
+def _adset_dict(s) -> dict[str, Any]:
+    return {
+        "id": s["id"],
+        "name": s["name"],
+        "status": s["status"],
+        "daily_budget": _cents_to_dollars(s.get("daily_budget")),
+        "lifetime_budget": _cents_to_dollars(s.get("lifetime_budget")),
+        "campaign_id": s.get("campaign_id", ""),
+    }
+
+
+def _ad_dict(a) -> dict[str, Any]:
+    return {
+        "id": a["id"],
+        "name": a["name"],
+        "status": a["status"],
+        "adset_id": a.get("adset_id", ""),
+    }
 
 
 # --- Status updates ---
@@ -82,6 +236,7 @@ def update_status(entity_type: str, entity_id: str, new_status: str) -> None:
     obj = cls(entity_id)
     obj[cls.Field.status] = new_status
     safe_api_call(obj.remote_update)
+    entities.invalidate(entity_id)
     logger.info("Updated %s %s status to %s", entity_type, entity_id, new_status)
 
 
@@ -100,6 +255,7 @@ def update_budget(
     budget_cents = str(int(round(daily_budget_dollars * 100)))
     obj[cls.Field.daily_budget] = budget_cents
     safe_api_call(obj.remote_update)
+    entities.invalidate(entity_id)
     logger.info(
         "Updated %s %s daily budget to $%.2f",
         entity_type,
@@ -0,0 +1,187 @@
+"""Timezone-aware report windows and a deduplicating fetch plan.
+
+Facebook buckets insights into days of each ad account's own timezone,
+so "yesterday" has to be computed there rather than from the server
+clock. Account timezones are looked up once per process, for all
+configured accounts at startup, and kept. Until an account is resolved,
+or if its lookup failed, the configured default timezone is used.
+
+FetchPlan collects every day range a run needs, merges overlapping and
+adjacent ranges per account and drops days that are already known, so
+executing the plan downloads each account-day at most once.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Iterable
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from facebook_business.api import FacebookAdsApi
+
+from src.facebook.client import safe_api_call
+from src.utils.errors import FacebookBotError
+
+logger = logging.getLogger("fb-ads-bot")
+
+# Seconds an account whose timezone lookup failed stays on the default
+# timezone before it is looked up again
+FAILED_LOOKUP_TTL = 3600
+
+_default_tz = ZoneInfo("UTC")
+_account_tz: dict[str, ZoneInfo] = {}
+# account_id -> time.monotonic() after which a failed lookup is retried
+_failed: dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def set_default_timezone(name: str) -> None:
+    """Timezone for accounts whose own timezone is not known (yet)."""
+    global _default_tz
+    _default_tz = ZoneInfo(name)
+
+
+def set_account_timezones(names: dict[str, str]) -> None:
+    """Record {account_id: timezone_name} as reported by the Graph API."""
+    with _lock:
+        for account_id, name in names.items():
+            try:
+                _account_tz[account_id] = ZoneInfo(name)
+            except (ZoneInfoNotFoundError, ValueError):
+                logger.warning("Unknown timezone %r for %s", name, account_id)
+
+
+def unresolved(account_ids: Iterable[str]) -> list[str]:
+    """Accounts to look up: not resolved and no recent failed lookup."""
+    now = time.monotonic()
+    with _lock:
+        return [
+            a
+            for a in dict.fromkeys(account_ids)
+            if a not in _account_tz and _failed.get(a, 0.0) <= now
+        ]
+
+
+def mark_failed(account_ids: Iterable[str]) -> None:
+    """Keep accounts on the default timezone for FAILED_LOOKUP_TTL seconds."""
+    retry_at = time.monotonic() + FAILED_LOOKUP_TTL
+    with _lock:
+        for account_id in account_ids:
+            if account_id not in _account_tz:
+                _failed[account_id] = retry_at
+
+
+def resolve_timezones(account_ids: Iterable[str]) -> None:
+    """Look up timezone_name for accounts not seen before, in one call.
+
+    Accounts the lookup fails for, or returns no usable timezone for, stay
+    on the default timezone and are not looked up again for
+    FAILED_LOOKUP_TTL seconds.
+    """
+    missing = unresolved(account_ids)
+    if not missing:
+        return
+    api = FacebookAdsApi.get_default_api()
+    try:
+        body = safe_api_call(
+            api.call, "GET", ("",), params=timezone_query(missing)
+        ).json()
+    except FacebookBotError as e:
+        logger.warning("Timezone lookup failed for %s: %s", missing, e)
+        mark_failed(missing)
+        return
+    set_account_timezones(timezone_names(body))
+    mark_failed(missing)
+
+
+def timezone_query(account_ids: list[str]) -> dict[str, Any]:
+    return {"ids": ",".join(account_ids), "fields": "timezone_name"}
+
+
+def timezone_names(body: dict[str, Any]) -> dict[str, str]:
+    return {
+        account_id: obj["timezone_name"]
+        for account_id, obj in body.items()
+        if isinstance(obj, dict) and obj.get("timezone_name")
+    }
+
+
+def account_timezone(account_id: str) -> ZoneInfo:
+    with _lock:
+        return _account_tz.get(account_id, _default_tz)
+
+
+# --- Windows ---
+
+
+def today(account_id: str) -> date:
+    return datetime.now(account_timezone(account_id)).date()
+
+
+def yesterday(account_id: str) -> date:
+    return today(account_id) - timedelta(days=1)
+
+
+def last_days(account_id: str, days: int) -> tuple[date, date]:
+    """The `days` complete days up to and including yesterday."""
+    until = yesterday(account_id)
+    return until - timedelta(days=days - 1), until
+
+
+def comparison_periods(account_id: str, days: int) -> list[tuple[str, str, str]]:
+    """Return [(label, since, until)] for the current and previous periods."""
+    current_start, current_end = last_days(account_id, days)
+    previous_end = current_start - timedelta(days=1)
+    previous_start = previous_end - timedelta(days=days - 1)
+    return [
+        (label, start.isoformat(), end.isoformat())
+        for label, start, end in [
+            ("current", current_start, current_end),
+            ("previous", previous_start, previous_end),
+        ]
+    ]
+
+
+# --- Plan ---
+
+
+@dataclass
+class FetchPlan:
+    """Day ranges to download per account, each account-day at most once."""
+
+    days: dict[str, set[date]] = field(default_factory=dict)
+
+    def add(self, account_id: str, since: date, until: date) -> None:
+        wanted = self.days.setdefault(account_id, set())
+        day = since
+        while day <= until:
+            wanted.add(day)
+            day += timedelta(days=1)
+
+    def add_last_days(self, account_id: str, days: int) -> None:
+        self.add(account_id, *last_days(account_id, days))
+
+    def exclude(self, account_id: str, known: Callable[[date], bool]) -> None:
+        """Drop the days of an account for which `known(day)` is true."""
+        wanted = self.days.get(account_id, set())
+        wanted.difference_update({d for d in wanted if known(d)})
+
+    def ranges(self) -> dict[str, list[tuple[date, date]]]:
+        """Merged, sorted and non-overlapping ranges per account."""
+        plan: dict[str, list[tuple[date, date]]] = {}
+        for account_id, wanted in self.days.items():
+            spans: list[tuple[date, date]] = []
+            for day in sorted(wanted):
+                if spans and spans[-1][1] + timedelta(days=1) == day:
+                    spans[-1] = (spans[-1][0], day)
+                else:
+                    spans.append((day, day))
+            if spans:
+                plan[account_id] = spans
+        return plan
+
+    def __len__(self) -> int:
+        return sum(len(wanted) for wanted in self.days.values())
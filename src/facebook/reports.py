@@ -0,0 +1,184 @@
+"""Asynchronous insights report jobs (AdReportRun).
+
+Long date spans and fine-grained levels make a synchronous insights call
+slow enough to time out or get throttled. For those queries we instead
+POST the query as a report job, poll the job with backoff until Facebook
+has finished it, and then page through its results like any other edge.
+The choice is made automatically from a rough estimate of the query size.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+from typing import Any, Iterator
+
+from facebook_business.api import FacebookAdsApi
+
+from src.facebook.client import iter_graph_pages, safe_api_call
+from src.utils.errors import ApiTimeoutError, FacebookBotError, TransientError
+
+logger = logging.getLogger("fb-ads-bot")
+
+# Queries spanning more days than this, or expected to return more rows,
+# run as report jobs instead of synchronous calls.
+REPORT_MIN_DAYS = 92
+REPORT_MIN_ROWS = 2000
+
+# Rough rows-per-day multiplier for each level and for each breakdown
+LEVEL_FANOUT = {"account": 1, "campaign": 20, "adset": 60, "ad": 200}
+BREAKDOWN_FANOUT = 8
+
+POLL_INITIAL = 2.0
+POLL_FACTOR = 1.5
+POLL_MAX = 30.0
+REPORT_DEADLINE = 30 * 60
+# Times a failed or skipped job is resubmitted before giving up
+REPORT_RETRIES = 1
+RESULT_PAGE_LIMIT = 500
+
+STATUS_FIELDS = "async_status,async_percent_completion"
+DONE = "Job Completed"
+FAILED = {"Job Failed", "Job Skipped"}
+
+# Deadline and cancel flag of the facade call running on this thread, if any
+_caller = threading.local()
+
+
+def span_days(params: dict[str, Any]) -> int:
+    """Number of calendar days covered by a query's time range(s)."""
+    ranges = params.get("time_ranges") or [params.get("time_range")]
+    days = 0
+    for r in ranges:
+        if r:
+            since = date.fromisoformat(r["since"])
+            until = date.fromisoformat(r["until"])
+            days += (until - since).days + 1
+    return days
+
+
+def estimate_rows(params: dict[str, Any]) -> int:
+    """Upper-bound guess of the rows a query returns."""
+    days = span_days(params)
+    increment = params.get("time_increment")
+    if increment in (None, "all_days"):
+        periods = len(params.get("time_ranges") or [None])
+    elif increment == "monthly":
+        periods = math.ceil(days / 30)
+    else:
+        periods = math.ceil(days / int(increment))
+    fanout = LEVEL_FANOUT.get(params.get("level", "account"), 1)
+    breakdowns = params.get("breakdowns") or []
+    if isinstance(breakdowns, str):
+        breakdowns = breakdowns.split(",")
+    return periods * fanout * BREAKDOWN_FANOUT ** len(breakdowns)
+
+
+def should_use_report(params: dict[str, Any]) -> bool:
+    return (
+        span_days(params) > REPORT_MIN_DAYS
+        or estimate_rows(params) > REPORT_MIN_ROWS
+    )
+
+
+@contextmanager
+def caller_limits(deadline: float, cancelled: threading.Event) -> Iterator[None]:
+    """Bound report jobs polled on this thread by a caller's deadline.
+
+    Polling gives up once the next poll would pass `deadline` (a
+    time.monotonic() value) and stops at once when `cancelled` is set.
+    """
+    _caller.deadline, _caller.cancelled = deadline, cancelled
+    try:
+        yield
+    finally:
+        del _caller.deadline, _caller.cancelled
+
+
+def poll_delays() -> Iterator[float]:
+    """Exponentially growing poll intervals, capped at POLL_MAX."""
+    delay = POLL_INITIAL
+    while True:
+        yield delay
+        delay = min(POLL_MAX, delay * POLL_FACTOR)
+
+
+def job_params(query: dict[str, Any]) -> dict[str, Any]:
+    """Report job submission parameters; paging is set when reading results."""
+    return {k: v for k, v in query.items() if k not in ("limit", "after")}
+
+
+def check_status(report_run_id: str, body: dict[str, Any]) -> bool:
+    """True once a job has completed; raises if Facebook gave up on it."""
+    status = body.get("async_status", "")
+    if status in FAILED:
+        raise TransientError(f"Report job {report_run_id} ended with '{status}'")
+    return status == DONE
+
+
+def iter_report_pages(
+    account_id: str, query: dict[str, Any]
+) -> Iterator[list[dict[str, Any]]]:
+    """Run an insights query as a report job and yield its raw result pages.
+
+    A failed or skipped job is resubmitted up to REPORT_RETRIES times.
+    Raises ApiTimeoutError if the job is still running after
+    REPORT_DEADLINE seconds, at the deadline set by caller_limits() if
+    that comes first, or when the caller has been cancelled.
+    """
+    for attempt in range(REPORT_RETRIES + 1):
+        report_run_id = submit_report(account_id, query)
+        try:
+            wait_for_report(report_run_id)
+        except TransientError as e:
+            if attempt == REPORT_RETRIES:
+                raise
+            logger.warning("%s; resubmitting", e)
+            continue
+        yield from iter_graph_pages(
+            (report_run_id, "insights"), {"limit": RESULT_PAGE_LIMIT}
+        )
+        return
+
+
+def submit_report(account_id: str, query: dict[str, Any]) -> str:
+    api = FacebookAdsApi.get_default_api()
+    response = safe_api_call(
+        api.call, "POST", (account_id, "insights"), params=job_params(query)
+    ).json()
+    report_run_id = response.get("report_run_id")
+    if not report_run_id:
+        raise FacebookBotError(f"No report job created for {account_id}")
+    logger.info("Submitted report job %s for %s", report_run_id, account_id)
+    return str(report_run_id)
+
+
+def wait_for_report(report_run_id: str) -> None:
+    api = FacebookAdsApi.get_default_api()
+    started = time.monotonic()
+    deadline = min(started + REPORT_DEADLINE, getattr(_caller, "deadline", math.inf))
+    cancelled = getattr(_caller, "cancelled", None) or threading.Event()
+    for delay in poll_delays():
+        body = safe_api_call(
+            api.call, "GET", (report_run_id,), params={"fields": STATUS_FIELDS}
+        ).json()
+        if check_status(report_run_id, body):
+            logger.info(
+                "Report job %s completed in %.0fs",
+                report_run_id,
+                time.monotonic() - started,
+            )
+            return
+        if time.monotonic() + delay > deadline:
+            raise ApiTimeoutError(
+                f"Report job {report_run_id} still running after "
+                f"{time.monotonic() - started:.0f}s "
+                f"({body.get('async_percent_completion', 0)}%)"
+            )
+        if cancelled.wait(delay):
+            raise ApiTimeoutError(
+                f"Stopped polling report job {report_run_id}: caller gave up"
+            )
@@ -0,0 +1,212 @@
+"""Client-side pacing driven by the Graph API usage headers.
+
+Every response carries X-Ad-Account-Usage, X-Business-Use-Case-Usage and
+X-App-Usage headers reporting how close we are to each limit (0-100%).
+We track the latest values per ad account, slow calls down as utilisation
+approaches the limit, and refuse calls outright while Facebook says access
+is blocked, reporting when it will be regained.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Mapping
+
+from src.utils.errors import RateLimitError
+
+logger = logging.getLogger("fb-ads-bot")
+
+# Start pacing above this utilisation (percent)
+PACE_THRESHOLD = 75.0
+# Delay applied just below 100% utilisation; scales linearly from 0
+MAX_PACE_DELAY = 20.0
+
+APP_KEY = "app"
+
+_ACCOUNT_RE = re.compile(r"act_(\d+)")
+
+
+@dataclass
+class Usage:
+    utilisation: float = 0.0
+    blocked_until: float = 0.0
+    updated: float = 0.0
+
+    @property
+    def retry_after(self) -> float:
+        return max(0.0, self.blocked_until - time.monotonic())
+
+
+class Throttle:
+    def __init__(
+        self,
+        pace_threshold: float = PACE_THRESHOLD,
+        max_delay: float = MAX_PACE_DELAY,
+    ) -> None:
+        self.pace_threshold = pace_threshold
+        self.max_delay = max_delay
+        self._usage: dict[str, Usage] = {}
+        self._lock = threading.Lock()
+
+    def before_call(self, account_id: str | None) -> None:
+        """Sleep as long as delay_for() says before making a call."""
+        delay = self.delay_for(account_id)
+        if delay > 0:
+            logger.info(
+                "Pacing call for %s by %.1fs", account_id or APP_KEY, delay
+            )
+            time.sleep(delay)
+
+    def delay_for(self, account_id: str | None) -> float:
+        """Return how long to wait before a call, from the last utilisation.
+
+        Raises RateLimitError (with retry_after) while access is blocked.
+        """
+        keys = [APP_KEY] + ([account_id] if account_id else [])
+        with self._lock:
+            usages = [self._usage[k] for k in keys if k in self._usage]
+        if not usages:
+            return 0.0
+
+        retry_after = max(u.retry_after for u in usages)
+        if retry_after > 0:
+            raise RateLimitError(
+                f"Rate limited for {account_id or 'app'}, "
+                f"access regained in {retry_after:.0f}s",
+                retry_after=retry_after,
+            )
+        return self.pace_delay(max(u.utilisation for u in usages))
+
+    def pace_delay(self, utilisation: float) -> float:
+        if utilisation < self.pace_threshold:
+            return 0.0
+        excess = (utilisation - self.pace_threshold) / (100.0 - self.pace_threshold)
+        return self.max_delay * min(1.0, excess)
+
+    def record(
+        self,
+        account_id: str | None,
+        headers: Mapping[str, str] | list[dict[str, str]] | None,
+    ) -> None:
+        """Update utilisation from a response's usage headers.
+
+        Batch sub-responses carry their headers as a list of
+        {"name": ..., "value": ...} entries, which is accepted too.
+        """
+        if isinstance(headers, list):
+            headers = {h.get("name", ""): h.get("value", "") for h in headers}
+        if not headers:
+            return
+        now = time.monotonic()
+        app = parse_app_usage(headers)
+        account = parse_account_usage(headers)
+        with self._lock:
+            if app is not None:
+                self._update(APP_KEY, app, 0.0, now)
+            if account_id and account is not None:
+                util, regain = account
+                self._update(account_id, util, regain, now)
+
+    def usage(self, account_id: str) -> Usage | None:
+        with self._lock:
+            return self._usage.get(account_id)
+
+    def retry_after(self, account_id: str) -> float:
+        """Seconds until a blocked account may be called again (0 if not)."""
+        usage = self.usage(account_id)
+        return usage.retry_after if usage else 0.0
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {
+                key: {"utilisation": u.utilisation, "retry_after": u.retry_after}
+                for key, u in self._usage.items()
+            }
+
+    def _update(self, key: str, util: float, regain: float, now: float) -> None:
+        usage = self._usage.setdefault(key, Usage())
+        usage.utilisation = util
+        usage.updated = now
+        if regain > 0:
+            usage.blocked_until = now + regain
+            logger.warning(
+                "%s blocked by Facebook for %.0fs (utilisation %.0f%%)",
+                key,
+                regain,
+                util,
+            )
+
+
+def account_from_path(path: Any) -> str | None:
+    """Extract act_<id> from a call path tuple or full URL."""
+    text = path if isinstance(path, str) else "/".join(map(str, path))
+    match = _ACCOUNT_RE.search(text)
+    return f"act_{match.group(1)}" if match else None
+
+
+def parse_account_usage(headers: Mapping[str, str]) -> tuple[float, float] | None:
+    """Return (utilisation %, seconds to regain access) for the ad account.
+
+    Combines X-Ad-Account-Usage with the worst business use case entry.
+    """
+    found = False
+    util = 0.0
+    regain = 0.0
+
+    acct = _header_json(headers, "x-ad-account-usage")
+    if isinstance(acct, dict):
+        found = True
+        util = float(acct.get("acc_id_util_pct", 0) or 0)
+        if util >= 100:
+            regain = float(acct.get("reset_time_duration", 0) or 0)
+
+    buc = _header_json(headers, "x-business-use-case-usage")
+    if isinstance(buc, dict):
+        for entries in buc.values():
+            for entry in entries or []:
+                found = True
+                util = max(
+                    util,
+                    float(entry.get("call_count", 0) or 0),
+                    float(entry.get("total_cputime", 0) or 0),
+                    float(entry.get("total_time", 0) or 0),
+                )
+                # Reported in minutes
+                minutes = entry.get("estimated_time_to_regain_access", 0) or 0
+                regain = max(regain, float(minutes) * 60)
+
+    return (util, regain) if found else None
+
+
+def parse_app_usage(headers: Mapping[str, str]) -> float | None:
+    app = _header_json(headers, "x-app-usage")
+    if not isinstance(app, dict):
+        return None
+    return max(
+        float(app.get("call_count", 0) or 0),
+        float(app.get("total_cputime", 0) or 0),
+        float(app.get("total_time", 0) or 0),
+    )
+
+
+def _header_json(headers: Mapping[str, str], name: str) -> Any:
+    raw = None
+    if hasattr(headers, "items"):
+        for key, value in headers.items():
+            if key.lower() == name:
+                raw = value
+                break
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except (TypeError, ValueError):
+        logger.debug("Unparseable %s header: %r", name, raw)
+        return None
+
+
+throttle = Throttle()
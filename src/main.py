@@ -8,10 +8,16 @@ import zoneinfo
 from telegram.ext import Application
 
 from config.settings import Settings
+from src.bot.digest import send_digest
 from src.bot.formatters import format_daily_report, format_error
 from src.bot.handlers import register_handlers
-from src.facebook.client import init_facebook_api
-from src.facebook.insights import get_daily_insights
+from src.bot.outbox import OutboundLimiter
+from src.facebook import aio, planner
+from src.facebook.async_graph import AsyncGraphClient
+from src.facebook.client import breaker, error_stats, init_facebook_api
+from src.facebook.fanout import fetch_accounts
+from src.facebook.insights import cache_stats
+from src.utils.errors import RateLimitError
 from src.utils.logger import setup_logger
 
 logger: logging.Logger = None  # type: ignore[assignment]
@@ -19,11 +25,49 @@ settings: Settings = None  # type: ignore[assignment]
 
 
 async def send_daily_report(context) -> None:
-    """Scheduled job: send daily report to the configured chat."""
-    logger.info("Running scheduled daily report")
-    for acct in settings.ad_account_ids:
+    """Scheduled job: send daily report to the configured chat.
+
+    In digest mode all accounts go out as one compact table; otherwise
+    each account gets its own message. Accounts that are rate limited with
+    a known regain time are retried by a one-off job once access is back
+    instead of reporting an error.
+    """
+    accounts = (context.job.data or {}).get("accounts") if context.job else None
+    accounts = accounts or settings.ad_account_ids
+    logger.info("Running scheduled daily report (%d accounts)", len(accounts))
+
+    suspended = [acct for acct in accounts if breaker.is_open(acct)]
+    if suspended:
+        logger.warning("Skipping suspended accounts: %s", ", ".join(suspended))
+        await context.bot.send_message(
+            chat_id=settings.telegram_chat_id,
+            text=format_error(
+                "Skipped (repeated permission/account errors): "
+                + ", ".join(suspended)
+            ),
+            parse_mode="MarkdownV2",
+        )
+        accounts = [acct for acct in accounts if acct not in suspended]
+
+    deferred: list[str] = []
+    retry_after = 0.0
+    digest = []
+    async for acct, data in fetch_accounts(accounts, aio.get_daily_insights):
+        if isinstance(data, RateLimitError) and data.retry_after:
+            logger.warning(
+                "Deferring %s: rate limited for %.0fs", acct, data.retry_after
+            )
+            deferred.append(acct)
+            retry_after = max(retry_after, data.retry_after)
+            continue
+        if settings.report_mode == "digest":
+            if isinstance(data, Exception):
+                logger.error("Daily report error for %s: %s", acct, data)
+            digest.append((acct, data))
+            continue
         try:
-            data = get_daily_insights(acct)
+            if isinstance(data, Exception):
+                raise data
             text = format_daily_report(acct, data)
         except Exception as e:
             logger.error("Daily report error for %s: %s", acct, e)
@@ -33,7 +77,28 @@ async def send_daily_report(context) -> None:
             text=text,
             parse_mode="MarkdownV2",
         )
+
+    if digest:
+        await send_digest(context.bot, settings.telegram_chat_id, digest)
+
+    if deferred:
+        context.job_queue.run_once(
+            send_daily_report,
+            when=retry_after + 5,
+            data={"accounts": deferred},
+            name="daily_report_retry",
+        )
+        logger.info(
+            "Rescheduled %d rate-limited accounts in %.0fs",
+            len(deferred),
+            retry_after + 5,
+        )
     logger.info("Daily report sent")
+    logger.info("Facebook API call stats: %s", aio.get_stats())
+    logger.info("Insights cache stats: %s", cache_stats())
+    logger.info("Facebook API error counts: %s", error_stats())
+    if context.bot.rate_limiter is not None:
+        logger.info("Telegram outbox stats: %s", context.bot.rate_limiter.stats())
 
 
 def main() -> None:
@@ -44,8 +109,30 @@ def main() -> None:
 
     settings = Settings.load()
     init_facebook_api(settings)
+    planner.set_default_timezone(settings.timezone)
+    # One multi-id lookup for every account, before any report needs them
+    planner.resolve_timezones(settings.ad_account_ids)
+    aio.init_executor(settings.fetch_concurrency, settings.api_timeout)
+
+    builder = (
+        Application.builder()
+        .token(settings.telegram_bot_token)
+        .rate_limiter(OutboundLimiter())
+    )
+    if settings.graph_backend == "async":
+        graph_client = AsyncGraphClient(
+            access_token=settings.facebook_access_token,
+            app_secret=settings.facebook_app_secret,
+            max_connections=settings.http_pool_size,
+            timeout=settings.http_timeout,
+        )
+        aio.use_async_backend(graph_client)
+
+        async def close_graph_client(app: Application) -> None:
+            await graph_client.aclose()
 
-    app = Application.builder().token(settings.telegram_bot_token).build()
+        builder = builder.post_shutdown(close_graph_client)
+    app = builder.build()
 
     register_handlers(app, settings)
 
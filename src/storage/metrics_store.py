@@ -0,0 +1,257 @@
+"""Local SQLite store of per-account, per-day insights.
+
+Rows are filled by daily time_increment fetches and only re-downloaded
+while Facebook may still restate them (insights.SETTLE_DAYS), so any
+window can be summarised locally instead of with a new API call.
+"""
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any
+
+from src.facebook import insights, planner
+from src.utils.errors import FacebookBotError
+
+logger = logging.getLogger("fb-ads-bot")
+
+SETTLE_DAYS = insights.SETTLE_DAYS
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_insights (
+    account_id   TEXT NOT NULL,
+    date         TEXT NOT NULL,
+    account_name TEXT NOT NULL,
+    impressions  INTEGER NOT NULL,
+    clicks       INTEGER NOT NULL,
+    cpm          REAL NOT NULL,
+    frequency    REAL NOT NULL,
+    spend        REAL NOT NULL,
+    leads        INTEGER NOT NULL,
+    cpl          REAL,
+    fetched_on   TEXT NOT NULL,
+    PRIMARY KEY (account_id, date)
+)
+"""
+
+_METRIC_COLUMNS = [
+    "account_name",
+    "impressions",
+    "clicks",
+    "cpm",
+    "frequency",
+    "spend",
+    "leads",
+    "cpl",
+]
+
+
+class MetricsStore:
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(_SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    # --- Writing ---
+
+    def upsert_days(
+        self,
+        account_id: str,
+        rows: list[dict[str, Any]],
+        fetched_on: date | None = None,
+    ) -> None:
+        """Insert or replace parsed daily rows (the _parse_rows shape).
+
+        `fetched_on` defaults to today in the account's timezone, the same
+        calendar as the row dates it is compared with.
+        """
+        fetched = (fetched_on or planner.today(account_id)).isoformat()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO daily_insights VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (account_id, row["date_start"])
+                    + tuple(row[col] for col in _METRIC_COLUMNS)
+                    + (fetched,)
+                    for row in rows
+                ],
+            )
+
+    def settled_days(
+        self, account_id: str, since: date, until: date
+    ) -> set[date]:
+        """Days in [since, until] stored after they settled; never refetched."""
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT date, fetched_on FROM daily_insights "
+                "WHERE account_id = ? AND date BETWEEN ? AND ?",
+                (account_id, since.isoformat(), until.isoformat()),
+            )
+            fetched = {
+                date.fromisoformat(r["date"]): date.fromisoformat(r["fetched_on"])
+                for r in cur
+            }
+        return {
+            day
+            for day, fetched_on in fetched.items()
+            if fetched_on >= day + timedelta(days=SETTLE_DAYS)
+        }
+
+    def plan(self, account_ids: list[str], days: int) -> planner.FetchPlan:
+        """Plan the missing or unsettled days of the last `days` days.
+
+        Windows end at yesterday in each account's own timezone.
+        """
+        plan = planner.FetchPlan()
+        for acct in account_ids:
+            since, until = planner.last_days(acct, days)
+            plan.add(acct, since, until)
+            settled = self.settled_days(acct, since, until)
+            plan.exclude(acct, settled.__contains__)
+        return plan
+
+    def backfill(self, account_ids: list[str], days: int) -> dict[str, Exception]:
+        """Fetch only the missing or unsettled part of the last `days` days.
+
+        All planned ranges go out as one batched request. Returns
+        {account_id: error} for accounts that could not be refreshed.
+        """
+        planner.resolve_timezones(account_ids)
+        plan = self.plan(account_ids, days)
+        ranges = plan.ranges()
+        if not ranges:
+            return {}
+        logger.info(
+            "Backfilling %d account-days across %d/%d accounts",
+            len(plan),
+            len(ranges),
+            len(account_ids),
+        )
+
+        errors: dict[str, Exception] = {}
+        for acct, rows in insights.fetch_plan(plan).items():
+            if isinstance(rows, FacebookBotError):
+                errors[acct] = rows
+                continue
+            name = rows[-1]["account_name"] if rows else self.account_name(acct)
+            for since, until in ranges[acct]:
+                self.upsert_days(acct, _fill_gaps(rows, since, until, name))
+        return errors
+
+    # --- Reading ---
+
+    def get_days(
+        self, account_id: str, since: date, until: date
+    ) -> list[dict[str, Any]]:
+        """Return stored daily rows in date order, in the _parse_rows shape."""
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT * FROM daily_insights "
+                "WHERE account_id = ? AND date BETWEEN ? AND ? ORDER BY date",
+                (account_id, since.isoformat(), until.isoformat()),
+            )
+            return [_row_to_dict(r) for r in cur]
+
+    def recent_days(self, account_id: str, days: int) -> list[dict[str, Any]]:
+        """Return the stored rows for the last `days` days up to yesterday."""
+        return self.get_days(account_id, *planner.last_days(account_id, days))
+
+    def account_name(self, account_id: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT account_name FROM daily_insights "
+                "WHERE account_id = ? ORDER BY date DESC LIMIT 1",
+                (account_id,),
+            ).fetchone()
+        return row["account_name"] if row else None
+
+    def summarize(
+        self, account_id: str, since: date, until: date
+    ) -> dict[str, Any] | None:
+        """Aggregate stored days into one row shaped like _parse_rows output.
+
+        Frequency is the impression-weighted mean of the daily frequencies,
+        not the period frequency the API reports: that needs the period's
+        unique reach, which does not add up across days. Label it as an
+        average wherever it is shown.
+        """
+        days = self.get_days(account_id, since, until)
+        if not days:
+            return None
+
+        impressions = sum(d["impressions"] for d in days)
+        spend = sum(d["spend"] for d in days)
+        leads = sum(d["leads"] for d in days)
+        return {
+            "account_name": days[-1]["account_name"],
+            "impressions": impressions,
+            "clicks": sum(d["clicks"] for d in days),
+            "cpm": spend / impressions * 1000 if impressions else 0.0,
+            "frequency": (
+                sum(d["frequency"] * d["impressions"] for d in days) / impressions
+                if impressions
+                else 0.0
+            ),
+            "spend": spend,
+            "leads": leads,
+            "cpl": spend / leads if leads else None,
+            "date_start": since.isoformat(),
+            "date_stop": until.isoformat(),
+        }
+
+    def comparison(
+        self, account_id: str, days: int = 7
+    ) -> dict[str, dict[str, Any] | None]:
+        """Local equivalent of insights.get_comparison_insights."""
+        return {
+            label: self.summarize(
+                account_id, date.fromisoformat(since), date.fromisoformat(until)
+            )
+            for label, since, until in planner.comparison_periods(account_id, days)
+        }
+
+
+def _row_to_dict(row: sqlite3.Row) -> dict[str, Any]:
+    out = {col: row[col] for col in _METRIC_COLUMNS}
+    out["date_start"] = out["date_stop"] = row["date"]
+    return out
+
+
+def _fill_gaps(
+    rows: list[dict[str, Any]], since: date, until: date, name: str | None
+) -> list[dict[str, Any]]:
+    """Add zero rows for days the API omitted, so they are not refetched."""
+    by_date = {row["date_start"]: row for row in rows}
+
+    out = []
+    day = since
+    while day <= until:
+        key = day.isoformat()
+        out.append(
+            by_date.get(key)
+            or {
+                "account_name": name or "Unknown",
+                "impressions": 0,
+                "clicks": 0,
+                "cpm": 0.0,
+                "frequency": 0.0,
+                "spend": 0.0,
+                "leads": 0,
+                "cpl": None,
+                "date_start": key,
+                "date_stop": key,
+            }
+        )
+        day += timedelta(days=1)
+    return out
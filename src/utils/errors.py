@@ -7,7 +7,19 @@ class TokenExpiredError(FacebookBotError):
 
 
 class RateLimitError(FacebookBotError):
-    """API rate limit hit."""
+    """API rate limit hit.
+
+    retry_after is the number of seconds until access is regained, when
+    Facebook reports it.
+    """
+
+    def __init__(self, message: str = "", retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TransientError(FacebookBotError):
+    """Temporary API or network failure that is worth retrying."""
 
 
 class PermissionError_(FacebookBotError):
@@ -16,3 +28,11 @@ class PermissionError_(FacebookBotError):
 
 class InvalidAccountError(FacebookBotError):
     """Ad account ID is invalid or inaccessible."""
+
+
+class ApiTimeoutError(FacebookBotError):
+    """API call did not finish within its deadline."""
+
+
+class CircuitOpenError(FacebookBotError):
+    """Calls to an ad account are suspended after repeated hard failures."""